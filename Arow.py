@@ -2,10 +2,20 @@ import pygame
 from pygame.locals import *
 import math
 import random
-from PIL import Image, ImageFilter
 import sys
 import os
-import ctypes
+import argparse
+import time
+import csv
+import json
+import subprocess
+import struct
+import zlib
+import itertools
+import multiprocessing
+from collections import deque, OrderedDict
+# numpy is imported by a startup stage (load_numpy) so the splash can be on screen first
+np = None
 
 def resource_path(relative_path):
     """ Get absolute path to resource, works for dev and for PyInstaller """
@@ -16,18 +26,76 @@ def resource_path(relative_path):
 
     return os.path.join(base_path, relative_path)
 
-# Enable High DPI on Windows
-try:
-    ctypes.windll.shcore.SetProcessDpiAwareness(1)
-except Exception:
-    pass
+if sys.platform == "win32":
+    import ctypes
 
-# Fix Taskbar Icon on Windows
-try:
-    myappid = 'arow.game.version.1.5' 
-    ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID(myappid)
-except Exception:
-    pass
+    # Enable High DPI on Windows
+    try:
+        ctypes.windll.shcore.SetProcessDpiAwareness(1)
+    except Exception:
+        pass
+
+    # Fix Taskbar Icon on Windows
+    try:
+        myappid = 'arow.game.version.1.5' 
+        ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID(myappid)
+    except Exception:
+        pass
+
+def parse_launch_options():
+    """ CLI flags, with AROW_* environment variables as defaults so imported/CI runs can be configured too """
+    parser = argparse.ArgumentParser(description="Arow - but better!")
+    parser.add_argument("--headless", action="store_true", default=os.environ.get("AROW_HEADLESS", "0") not in ("", "0"),
+                        help="no window, no drawing and no frame cap; steps the game logic as fast as possible")
+    parser.add_argument("--frames", type=int, default=int(os.environ.get("AROW_FRAMES", "0")),
+                        help="headless: stop after this many frames (0 = no limit)")
+    parser.add_argument("--waves", type=int, default=int(os.environ.get("AROW_WAVES", "0")),
+                        help="headless: stop once this wave is reached (0 = no limit)")
+    parser.add_argument("--start-wave", default=os.environ.get("AROW_START_WAVE", "1"),
+                        help="headless: wave to start on, same as the Custom Start box")
+    parser.add_argument("--render-fps", type=int, default=int(os.environ.get("AROW_RENDER_FPS", "240")),
+                        help="render frame cap, independent of the fixed simulation rate (0 = uncapped)")
+    parser.add_argument("--max-catchup", type=int, default=int(os.environ.get("AROW_MAX_CATCHUP", "5")),
+                        help="most simulation ticks run per rendered frame before falling behind real time")
+    parser.add_argument("--timing-csv", default=os.environ.get("AROW_TIMING_CSV", ""),
+                        help="write per-phase frame timings to this CSV file on exit")
+    parser.add_argument("--benchmark", default=os.environ.get("AROW_BENCHMARK", ""),
+                        help="run benchmark scenarios offscreen and print JSON: 'all' or comma-separated names")
+    parser.add_argument("--bench-ticks", type=int, default=int(os.environ.get("AROW_BENCH_TICKS", "600")),
+                        help="benchmark: simulation ticks per scenario")
+    parser.add_argument("--bench-output", default=os.environ.get("AROW_BENCH_OUTPUT", ""),
+                        help="benchmark: write the JSON report to this file instead of stdout")
+    parser.add_argument("--seed", type=int, default=int(os.environ["AROW_SEED"]) if os.environ.get("AROW_SEED") else None,
+                        help="RNG seed for every game started (random per game if unset; benchmarks default to 1)")
+    parser.add_argument("--record", default=os.environ.get("AROW_RECORD", ""),
+                        help="record the seed, settings and per-tick input of each game to this file")
+    parser.add_argument("--replay", default=os.environ.get("AROW_REPLAY", ""),
+                        help="play back a --record file; add --headless to run it at max speed")
+    parser.add_argument("--sweep", default=os.environ.get("AROW_SWEEP", ""),
+                        help="balance sweep over a settings grid, e.g. 'enemy_health=0.5,1,2 spawn_count_mult=1,3 weight.tank=1,3'")
+    parser.add_argument("--sweep-seeds", type=int, default=int(os.environ.get("AROW_SWEEP_SEEDS", "10")),
+                        help="sweep: seeded bot runs per grid point")
+    parser.add_argument("--sweep-output", default=os.environ.get("AROW_SWEEP_OUTPUT", ""),
+                        help="sweep: write the JSON report to this file instead of stdout")
+    parser.add_argument("--jobs", type=int, default=int(os.environ.get("AROW_JOBS", "0")),
+                        help="sweep: worker processes (0 = one per core)")
+    parser.add_argument("--memory-report", default=os.environ.get("AROW_MEMORY_REPORT", ""),
+                        help="trace allocations and append a JSON line of memory stats to this file at every wave boundary")
+    parser.add_argument("--god", action="store_true", default=os.environ.get("AROW_GOD", "0") not in ("", "0"),
+                        help="headless: infinite health so the run is not cut short by game over")
+    parser.add_argument("--bot", action="store_true", default=os.environ.get("AROW_BOT", "0") not in ("", "0"),
+                        help="drive the player with the built-in bot (the one --sweep uses) instead of keyboard and mouse")
+    return parser.parse_known_args(sys.argv[1:] if __name__ == "__main__" else [])[0]
+
+launch_options = parse_launch_options()
+HEADLESS = launch_options.headless
+OFFSCREEN = HEADLESS or bool(launch_options.benchmark or launch_options.sweep) # No real window; benchmarks still render, to a dummy display
+if OFFSCREEN:
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+startup_begin = time.perf_counter()
+startup_timings = {} # Stage name -> ms, printed once startup finishes
 
 pygame.init()
 try:
@@ -40,7 +108,7 @@ info = pygame.display.Info()
 NATIVE_WIDTH, NATIVE_HEIGHT = info.current_w, info.current_h
 WIDTH, HEIGHT = 1280, 720 
 
-fullscreen = True 
+fullscreen = not OFFSCREEN
 
 if fullscreen:
     screen = pygame.display.set_mode((0, 0), pygame.FULLSCREEN, pygame.HWSURFACE | pygame.DOUBLEBUF) 
@@ -49,30 +117,84 @@ else:
     screen = pygame.display.set_mode((WIDTH, HEIGHT), pygame.RESIZABLE) 
 
 pygame.display.set_caption("Arow - but better!")
+startup_timings['display'] = (time.perf_counter() - startup_begin) * 1000
 
 WHITE, BLACK, RED = (255, 255, 255), (30, 30, 30), (255, 50, 50)
 BLUE, YELLOW, GREEN = (100, 150, 255), (255, 255, 0), (0, 255, 0)
 ORANGE, CYAN, PURPLE = (255, 165, 0), (0, 255, 255), (180, 0, 255)
 GRID_COLOR, PLAYER_COLOR = (80, 80, 80), (200, 220, 255)
 
-try:
-    font = pygame.font.Font("freesansbold.ttf", 24)
-    title_font = pygame.font.Font("freesansbold.ttf", 96)
-    ui_font = pygame.font.Font("freesansbold.ttf", 18)
-except FileNotFoundError:
-    font, title_font, ui_font = pygame.font.Font(None, 36), pygame.font.Font(None, 120), pygame.font.Font(None, 28)
+font, title_font, ui_font = None, None, None
+FONT_FACE = "freesansbold.ttf"
+TEXT_CACHE_SIZE = 256
+font_registry = {} # (face, size) -> Font, so rebuilding the menus doesn't reopen the font file
+
+def get_font(size, fallback_size=None, face=FONT_FACE):
+    """ Shared Font for (face, size); pygame's default font at fallback_size if the face can't be loaded """
+    key = (face, size)
+    if key not in font_registry:
+        try:
+            font_registry[key] = pygame.font.Font(face, size)
+        except FileNotFoundError:
+            font_registry[key] = pygame.font.Font(None, fallback_size or size)
+    return font_registry[key]
+
+def load_fonts():
+    global font, title_font, ui_font
+    font, title_font, ui_font = get_font(24, 36), get_font(96, 120), get_font(18, 28)
+
+class TextCache:
+    """ Bounded LRU of rendered text keyed by (font, text, color). Static labels always hit; HUD values miss only when
+        they change """
+    def __init__(self, capacity=TEXT_CACHE_SIZE):
+        self.surfaces, self.capacity, self.hits, self.misses = OrderedDict(), capacity, 0, 0
+
+    def render(self, font, text, color):
+        key = (font, text, color)
+        surf = self.surfaces.get(key)
+        if surf is None:
+            self.misses += 1
+            surf = self.surfaces[key] = font.render(text, True, color)
+            if len(self.surfaces) > self.capacity: self.surfaces.popitem(last=False)
+        else:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+        return surf
+
+text_cache = TextCache()
+render_text = text_cache.render
 
 MAP_WIDTH, MAP_HEIGHT = 2600, 2600
+MAP_RECT = pygame.Rect(0, 0, MAP_WIDTH, MAP_HEIGHT)
+SIM_FPS = 60
+SIM_DT = 1 / SIM_FPS
 WAVE_COOLDOWN = 240
 POWERUP_DROP_CHANCE = 0.22
-PARTICLE_LIMIT = 400
+PARTICLE_LIMIT = 12000
+PARTICLE_ALPHA_BUCKETS = 16
+BULLET_ANGLE_STEP = 2
+BEAM_ANGLE_STEP = 1
+PLAYER_ANGLE_STEP = 1
+BEAM_TILE_LENGTH = 100
+PLAYER_HIT_RADIUS = 12
+BULLET_HALF_LENGTH, BULLET_HALF_WIDTH = 6, 2 # Bullets are 12x4 rects
+SWEEP_MIN_STEP = 5 # Anything moving further than this per tick is hit-tested along its whole step, not at its end point
 POWERUP_DROP_TABLE = ['health', 'health', 'health', 'dash_charge', 'dash_charge', 'rapid_fire', 'plasma_ball']
 BOSS_POWERUP_SPAWN_RATE = 240  
+SPATIAL_CELL_SIZE = 128
+FLOW_CELL_SIZE = 64
+FLOW_DIRECT_RANGE = 128 # Closer than this, enemies steer straight at the player instead of following the flow field
+CROWD_AVOIDANCE = 0.5 # How far the crowd slope can bend the flow; under 1, so it never cancels pursuit
+FLOW_GRID_MIN_ENEMIES = 64 # Below this, enemies count their neighbors pairwise instead of binning the whole grid
+SEPARATION_RADIUS, SEPARATION_SPEED = 48, 0.8
+WAVE_SPAWN_BUDGET = 8 # Enemies the wave director builds per tick
 
 screen_shake = 0
+sim_frame = 0
 game_paused = False
 smooth_camera_follow = True
 camera_smooth_factor = 0.08
+show_spatial_debug = False
 
 custom_start_wave_str = "1"
 wave_input_active = False
@@ -89,7 +211,7 @@ adv_settings = {
 adv_input_active = None # Key of setting being edited or None
 adv_input_str = ""
 
-splash_screen_active = True 
+splash_screen_active = not OFFSCREEN
 splash_start_time = 0 
 splash_duration = 3000 
 fade_in_duration = 500 
@@ -99,38 +221,428 @@ splash_rect = None
 
 
 
+class CommandBuffer:
+    """ Spawns, kills, particle bursts and screen shake requested while update_game() runs. flush() applies them in
+        request order at the end of each phase, so no group changes under the code iterating it """
+    def __init__(self):
+        self.queue, self.dying = [], set()
+
+    def spawn(self, sprite, *groups):
+        self.queue.append(('spawn', sprite, groups))
+
+    def kill(self, sprite):
+        """ The sprite is out of play (see in_play) right away and leaves its groups at the next flush """
+        if sprite in self.dying: return
+        self.dying.add(sprite)
+        self.queue.append(('kill', sprite))
+
+    def particles(self, *args):
+        self.queue.append(('particles', args))
+
+    def shake(self, amount):
+        self.queue.append(('shake', amount))
+
+    def in_play(self, sprite):
+        return sprite.alive() and sprite not in self.dying
+
+    def flush(self):
+        global screen_shake
+        for command in self.queue:
+            if command[0] == 'spawn':
+                for group in command[2]: group.add(command[1])
+            elif command[0] == 'kill':
+                command[1].kill()
+            elif command[0] == 'particles':
+                particles.emit(*command[1])
+            else:
+                screen_shake = command[1]
+        self.clear()
+
+    def clear(self):
+        self.queue.clear()
+        self.dying.clear()
+
+commands = CommandBuffer()
+
 def create_particles(position, count, color, min_speed, max_speed, min_life, max_life):
-    if len(particles) > PARTICLE_LIMIT - count: return
-    for _ in range(count):
-        particles.add(Particle(position, color, min_speed, max_speed, min_life, max_life))
-
-def create_grid_surface(width, height, grid_color, line_spacing=100):
-    grid_surf = pygame.Surface((width, height), pygame.SRCALPHA)
-    for x in range(0, width + line_spacing, line_spacing):
-        pygame.draw.line(grid_surf, grid_color, (x, 0), (x, height))
-    for y in range(0, height + line_spacing, line_spacing):
-        pygame.draw.line(grid_surf, grid_color, (0, y), (width, y))
-    return grid_surf
-
-class Particle(pygame.sprite.Sprite):
-    def __init__(self, pos, color, min_speed, max_speed, min_life, max_life):
-        super().__init__()
-        angle, speed = random.uniform(0, 2 * math.pi), random.uniform(min_speed, max_speed)
-        self.velocity = [math.cos(angle) * speed, math.sin(angle) * speed]
-        self.lifespan = random.randint(min_life, max_life)
-        self.initial_lifespan = self.lifespan
-        self.size = random.randint(2, 5)
-        self.image = pygame.Surface((self.size * 2, self.size * 2), pygame.SRCALPHA)
-        pygame.draw.circle(self.image, color, (self.size, self.size), self.size)
-        self.rect, self.pos = self.image.get_rect(center=pos), list(pos)
+    commands.particles(tuple(position), count, color, min_speed, max_speed, min_life, max_life)
+
+SPRITE_COLORKEY = (255, 0, 255) # Never used in art, marks transparent pixels of baked opaque sprites
+
+def bake_surface(surf, opaque=True):
+    """ Converts generated art to the display pixel format. Hard-edged art becomes a colorkeyed RLE surface,
+        anything with partial alpha keeps per-pixel alpha """
+    if not opaque: return surf.convert_alpha()
+    baked = pygame.Surface(surf.get_size()).convert()
+    baked.fill(SPRITE_COLORKEY)
+    baked.blit(surf, (0, 0))
+    baked.set_colorkey(SPRITE_COLORKEY, RLEACCEL)
+    return baked
+
+class Background:
+    """ The scrolling grid and the arena outline. The grid is baked once per resolution into an opaque surface one grid
+        step larger than the screen, so each frame is a single blit of the right window of it (which also clears the
+        screen). The outline's four edges are kept as world-space rects for the current map size and filled directly """
+    def __init__(self, color=GRID_COLOR, spacing=100, border=3):
+        self.color, self.spacing, self.border = color, spacing, border
+        self.surface, self.map_size, self.edges = None, None, []
+
+    def resize(self, width, height):
+        self.surface = pygame.Surface((width + self.spacing, height + self.spacing)).convert()
+        self.surface.fill(BLACK)
+        for x in range(0, width + self.spacing * 2, self.spacing):
+            pygame.draw.line(self.surface, self.color, (x, 0), (x, height + self.spacing))
+        for y in range(0, height + self.spacing * 2, self.spacing):
+            pygame.draw.line(self.surface, self.color, (0, y), (width + self.spacing, y))
+
+    def set_map_size(self, size):
+        left, top, b = (MAP_WIDTH - size) / 2, (MAP_HEIGHT - size) / 2, self.border
+        self.map_size = size
+        self.edges = [pygame.Rect(left, top, size, b), pygame.Rect(left, top + size - b, size, b),
+                      pygame.Rect(left, top, b, size), pygame.Rect(left + size - b, top, b, size)]
+
+    def draw(self, surface, view):
+        if self.map_size != current_map_size: self.set_map_size(current_map_size)
+        width, height = surface.get_size()
+        surface.blit(self.surface, (0, 0), (int(view.x) % self.spacing, int(view.y) % self.spacing, width, height))
+        for edge in self.edges: surface.fill(WHITE, edge.move(-view.x, -view.y))
+
+background = Background()
+
+np_rng = None
+fx_random = random.Random() # Render-only randomness (screen shake) so drawing never disturbs the gameplay RNG
+
+def load_numpy():
+    global np, np_rng
+    import numpy as np
+    np_rng = np.random.default_rng()
+
+def seed_rngs(seed):
+    """ Seeds both the gameplay RNG (random) and the NumPy one used for effects """
+    global np_rng
+    random.seed(seed)
+    np_rng = np.random.default_rng(seed)
+
+# Pre-rendered particle dots keyed by (palette index, size, alpha bucket)
+particle_sprite_cache = {}
+particle_palette, particle_palette_index = [], {}
+
+def get_particle_sprite(key):
+    if key not in particle_sprite_cache:
+        color_index, rest = divmod(key, 8 * (PARTICLE_ALPHA_BUCKETS + 1))
+        size, bucket = divmod(rest, PARTICLE_ALPHA_BUCKETS + 1)
+        surf = pygame.Surface((size * 2, size * 2), pygame.SRCALPHA)
+        alpha = 255 * bucket // PARTICLE_ALPHA_BUCKETS
+        pygame.draw.circle(surf, (*particle_palette[color_index][:3], alpha), (size, size), size)
+        particle_sprite_cache[key] = bake_surface(surf, opaque=False)
+    return particle_sprite_cache[key]
+
+class ParticleSystem:
+    """ Structure-of-arrays particle pool. Live particles occupy [0, count) of preallocated NumPy arrays """
+    def __init__(self, capacity=PARTICLE_LIMIT):
+        self.capacity, self.count = capacity, 0
+        self.pos = np.zeros((capacity, 2), np.float32)
+        self.vel = np.zeros((capacity, 2), np.float32)
+        self.life = np.zeros(capacity, np.int32)
+        self.max_life = np.ones(capacity, np.int32)
+        self.size = np.zeros(capacity, np.int32)
+        self.color = np.zeros(capacity, np.int32)
+
+    def __len__(self):
+        return self.count
+
+    def color_index(self, color):
+        color = tuple(color)
+        if color not in particle_palette_index:
+            particle_palette_index[color] = len(particle_palette)
+            particle_palette.append(color)
+        return particle_palette_index[color]
+
+    def emit(self, position, count, color, min_speed, max_speed, min_life, max_life):
+        count = min(count, self.capacity - self.count)
+        if count <= 0: return
+        new = slice(self.count, self.count + count)
+        angle, speed = np_rng.uniform(0, 2 * math.pi, count), np_rng.uniform(min_speed, max_speed, count)
+        self.pos[new] = (position[0], position[1])
+        self.vel[new, 0], self.vel[new, 1] = np.cos(angle) * speed, np.sin(angle) * speed
+        self.life[new] = np_rng.integers(min_life, max_life + 1, count)
+        self.max_life[new] = self.life[new]
+        self.size[new] = np_rng.integers(2, 6, count)
+        self.color[new] = self.color_index(color)
+        self.count += count
 
     def update(self):
-        self.pos[0] += self.velocity[0];
-        self.pos[1] += self.velocity[1]
-        self.rect.center = self.pos
-        self.lifespan -= 1
-        if self.lifespan <= 0: self.kill()
-        self.image.set_alpha(int(255 * (self.lifespan / self.initial_lifespan)))
+        n = self.count
+        if not n: return
+        self.pos[:n] += self.vel[:n]
+        self.life[:n] -= 1
+        alive = self.life[:n] > 0
+        if not alive.all():
+            keep = np.flatnonzero(alive)
+            for arr in (self.pos, self.vel, self.life, self.max_life, self.size, self.color):
+                arr[:len(keep)] = arr[keep]
+            self.count = len(keep)
+
+    def draw(self, surface, camera, alpha=1.0):
+        n = self.count
+        if not n: return 0
+        size, life = self.size[:n], self.life[:n]
+        lag = 1.0 - alpha # Motion is linear, so the in-between position is just a step back along vel
+        x = (self.pos[:n, 0] - self.vel[:n, 0] * lag - camera.x).astype(np.int32) - size
+        y = (self.pos[:n, 1] - self.vel[:n, 1] * lag - camera.y).astype(np.int32) - size
+        width, height = surface.get_size()
+        visible = (x > -12) & (x < width) & (y > -12) & (y < height)
+        if not visible.any(): return 0
+        bucket = (life * PARTICLE_ALPHA_BUCKETS + self.max_life[:n] - 1) // self.max_life[:n]
+        keys = (self.color[:n] * 8 + size) * (PARTICLE_ALPHA_BUCKETS + 1) + bucket
+        keys, x, y = keys[visible].tolist(), x[visible].tolist(), y[visible].tolist()
+        sprite = particle_sprite_cache.get
+        surface.blits([(sprite(k) or get_particle_sprite(k), (px, py)) for k, px, py in zip(keys, x, y)], doreturn=False)
+        return len(keys)
+
+def closest_on_segment(start, end, point):
+    """ (t, distance): how far along start->end (0..1) the point closest to point lies, and how far away it is """
+    dx, dy = end[0] - start[0], end[1] - start[1]
+    length_sq = dx * dx + dy * dy
+    t = 0.0 if length_sq == 0 else max(0.0, min(1.0, ((point[0] - start[0]) * dx + (point[1] - start[1]) * dy) / length_sq))
+    return t, math.hypot(start[0] + dx * t - point[0], start[1] + dy * t - point[1])
+
+class SpatialHash:
+    """ Uniform grid over the map for broad-phase collision. Rebuilt once per frame, queries only visit overlapped cells """
+    def __init__(self, cell_size=SPATIAL_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}
+
+    def cell_range(self, rect):
+        cs = self.cell_size
+        return range(rect.left // cs, rect.right // cs + 1), range(rect.top // cs, rect.bottom // cs + 1)
+
+    def insert(self, sprite):
+        xs, ys = self.cell_range(sprite.rect)
+        for cx in xs:
+            for cy in ys:
+                cell = self.cells.get((cx, cy))
+                if cell is None: self.cells[(cx, cy)] = [sprite]
+                else: cell.append(sprite)
+
+    def rebuild(self, *groups):
+        self.cells.clear()
+        for group in groups:
+            for sprite in group: self.insert(sprite)
+
+    def query_rect(self, rect):
+        # Keeps insertion order (not set order) so hit resolution stays deterministic
+        found, seen = [], set()
+        xs, ys = self.cell_range(rect)
+        for cx in xs:
+            for cy in ys:
+                for sprite in self.cells.get((cx, cy), ()):
+                    if sprite not in seen:
+                        seen.add(sprite)
+                        found.append(sprite)
+        return found
+
+    def collide(self, sprite):
+        """ Live sprites whose rect overlaps sprite.rect, like spritecollide against the indexed groups """
+        return [other for other in self.query_rect(sprite.rect) if commands.in_play(other) and sprite.rect.colliderect(other.rect)]
+
+    def sweep(self, start, end, radius):
+        """ Live sprites that a circle of radius moving from start to end touches on the way, in the order it reaches
+            them. Sprites count as circles half their rect width across """
+        dx, dy = end[0] - start[0], end[1] - start[1]
+        area = pygame.Rect(min(start[0], end[0]) - radius, min(start[1], end[1]) - radius,
+                           abs(dx) + radius * 2 + 1, abs(dy) + radius * 2 + 1)
+        hits = []
+        for other in self.query_rect(area):
+            if not commands.in_play(other): continue
+            t, distance = closest_on_segment(start, end, other.rect.center)
+            if distance < radius + other.rect.width / 2: hits.append((t, other))
+        hits.sort(key=lambda hit: hit[0])
+        return [other for _, other in hits]
+
+    def query_radius(self, pos, radius):
+        """ Live sprites whose center is within radius of pos """
+        area = pygame.Rect(pos[0] - radius, pos[1] - radius, radius * 2, radius * 2)
+        return [other for other in self.query_rect(area)
+                if commands.in_play(other) and pygame.math.Vector2(other.rect.center).distance_to(pos) < radius]
+
+    def draw_debug(self, surface, camera):
+        """ Outlines occupied cells, tinted by how many sprites they hold """
+        cs = self.cell_size
+        for (cx, cy), cell in self.cells.items():
+            cell_rect = pygame.Rect(cx * cs - camera.x, cy * cs - camera.y, cs, cs)
+            heat = min(255, len(cell) * 32)
+            pygame.draw.rect(surface, (heat, 255 - heat, 0), cell_rect, 1)
+            count_surf = render_text(ui_font, str(len(cell)), WHITE)
+            surface.blit(count_surf, (cell_rect.x + 4, cell_rect.y + 4))
+
+enemy_hash = SpatialHash()
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+class FrameTimer:
+    """ Per-phase wall-clock timing. lap(phase) charges the time since the previous mark to that phase. Frames are only
+        timed and kept while the F4 overlay is up or a timing CSV was asked for; otherwise every call returns at once """
+    def __init__(self, window=240, history=36000, recording=False):
+        self.window, self.recording = window, recording
+        self.history, self.size, self.recorded = None, history, 0 # Ring of one row per frame, allocated on first use
+        self.columns, self.phases, self.counters = {'total': 0}, [], []
+        self.current, self.active = {}, False
+        self.frame_start = self.mark = time.perf_counter()
+        self.visible = False
+        self.stats, self.stats_age, self.panel = [], 0, None
+
+    def start_frame(self):
+        self.active = self.visible or self.recording
+        if not self.active: return
+        self.current.clear()
+        self.frame_start = self.mark = time.perf_counter()
+
+    def lap(self, phase):
+        if not self.active: return
+        now = time.perf_counter()
+        self.current[phase] = self.current.get(phase, 0.0) + (now - self.mark) * 1000
+        self.mark = now
+        if phase not in self.columns: self.phases.append(phase); self.add_column(phase)
+
+    def count(self, counter, value):
+        """ Records a per-frame quantity (not a time) alongside the phases, e.g. sprites culled """
+        if not self.active: return
+        self.current[counter] = value
+        if counter not in self.columns: self.counters.append(counter); self.add_column(counter)
+
+    def add_column(self, name):
+        self.columns[name] = len(self.columns)
+        if self.history is not None and len(self.columns) > self.history.shape[1]:
+            self.history = np.concatenate([self.history, np.zeros_like(self.history)], axis=1)
+
+    def end_frame(self):
+        if not self.active: return
+        self.active = False
+        if self.history is None: self.history = np.zeros((self.size, max(32, len(self.columns))))
+        row = self.history[self.recorded % self.size]
+        row[:] = 0
+        row[0] = (time.perf_counter() - self.frame_start) * 1000
+        for name, value in self.current.items(): row[self.columns[name]] = value
+        self.recorded += 1
+
+    def recent(self, count=None):
+        """ The last count recorded frames (all kept ones by default), oldest first. Column 0 is the frame total """
+        kept = min(self.recorded, self.size)
+        count = kept if count is None else min(count, kept)
+        if count == 0: return np.zeros((0, len(self.columns)))
+        return self.history[np.arange(self.recorded - count, self.recorded) % self.size]
+
+    def summarize(self):
+        """ (phase, mean, p95, p99) over the rolling window, in ms """
+        recent = self.recent(self.window)
+        rows = []
+        if len(recent) == 0: return rows
+        for phase in self.phases + ['total']:
+            values = sorted(recent[:, self.columns[phase]].tolist())
+            rows.append((phase, sum(values) / len(values), percentile(values, 0.95), percentile(values, 0.99)))
+        return rows
+
+    def export_csv(self, path):
+        columns = self.phases + ['total']
+        frames = self.recent()
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['frame'] + columns + self.counters)
+            for i, frame in enumerate(frames, self.recorded - len(frames)):
+                writer.writerow([i] + [f"{frame[self.columns[phase]]:.4f}" for phase in columns] + [int(frame[self.columns[counter]]) for counter in self.counters])
+        print(f"Frame timings written to {path} ({len(frames)} frames)")
+
+    def draw(self, surface, x, y):
+        # The text panel is only re-rendered a few times a second; the graph is drawn every frame
+        self.stats_age -= 1
+        if self.panel is None or self.stats_age <= 0:
+            self.stats_age = 15
+            lines = ["phase            avg    p95    p99 (ms)"]
+            lines += [f"{phase[:14]:<14} {avg:6.2f} {p95:6.2f} {p99:6.2f}" for phase, avg, p95, p99 in self.summarize()]
+            if self.recorded:
+                last = self.recent(1)[0]
+                lines.append("  ".join(f"{counter}: {int(last[self.columns[counter]])}" for counter in self.counters))
+            line_height = ui_font.get_linesize()
+            self.panel = pygame.Surface((360, line_height * len(lines) + 90), pygame.SRCALPHA)
+            self.panel.fill((0, 0, 0, 170))
+            for i, line in enumerate(lines):
+                self.panel.blit(ui_font.render(line, True, WHITE), (8, 4 + i * line_height))
+        surface.blit(self.panel, (x, y))
+
+        graph = pygame.Rect(x + 8, y + self.panel.get_height() - 84, 344, 76)
+        pygame.draw.rect(surface, (60, 60, 60), graph, 1)
+        budget_y = graph.bottom - graph.height * (1000 / SIM_FPS) / 50 # 50 ms full scale
+        pygame.draw.line(surface, GREEN, (graph.left, budget_y), (graph.right, budget_y))
+        totals = self.recent(graph.width)[:, 0].tolist()
+        if len(totals) > 1:
+            points = [(graph.left + i, graph.bottom - min(t, 50) / 50 * graph.height) for i, t in enumerate(totals)]
+            pygame.draw.lines(surface, YELLOW, False, points)
+
+frame_timer = FrameTimer(recording=bool(launch_options.timing_csv))
+
+class MemoryReport:
+    """ Opt-in (--memory-report PATH) memory instrumentation. At each wave boundary it appends one JSON line: traced
+        and resident memory, live counts per sprite group and per class, sprites that left every group but are still
+        referenced, cache sizes, and the allocation sites that grew most since the last wave (tracemalloc diff) """
+    def __init__(self, path, top=10):
+        import tracemalloc, gc
+        self.tracemalloc, self.gc = tracemalloc, gc
+        tracemalloc.start()
+        self.path, self.top = path, top
+        self.snapshot, self.types, self.frame = None, {}, 0
+        open(path, 'w').close()
+
+    def take_snapshot(self):
+        return self.tracemalloc.take_snapshot().filter_traces([self.tracemalloc.Filter(False, self.tracemalloc.__file__),
+                                                               self.tracemalloc.Filter(False, "<frozen importlib._bootstrap*>")])
+
+    def live_objects(self):
+        """ (instances per GC-tracked type, sprites per class, sprites in no group). Surfaces and Vector2s aren't
+            GC-tracked, so they only show up in the allocation sites and RSS """
+        types, sprites, dead = {}, {}, {}
+        for obj in self.gc.get_objects():
+            name = type(obj).__name__
+            types[name] = types.get(name, 0) + 1
+            if isinstance(obj, pygame.sprite.Sprite):
+                sprites[name] = sprites.get(name, 0) + 1
+                if not obj.alive() and obj is not player: dead[name] = dead.get(name, 0) + 1
+        return types, sprites, dead
+
+    def wave_boundary(self):
+        self.gc.collect()
+        snapshot = self.take_snapshot()
+        frames = max(sim_frame - self.frame, 1)
+        types, sprites, dead = self.live_objects()
+        current, peak = self.tracemalloc.get_traced_memory()
+        record = {
+            'wave': current_wave, 'tick': sim_frame, 'traced_kb': current // 1024, 'traced_peak_kb': peak // 1024,
+            'groups': {'enemies': len(enemies), 'bosses': len(boss_group), 'player_bullets': len(bullets),
+                       'enemy_bullets': len(enemy_bullets), 'plasma_balls': len(plasma_balls), 'powerups': len(powerups),
+                       'beams': len(beams), 'all_sprites': len(all_sprites), 'particles': len(particles)},
+            'sprites': sprites, 'dead_sprites': dead,
+            'caches': {'sprite_image': len(sprite_image_cache), 'particle_sprite': len(particle_sprite_cache),
+                       'trail_particle': len(trail_particle_cache), 'enemy_bullet_sprites': len(enemy_bullets.sprite_table),
+                       'text': len(text_cache.surfaces), 'fonts': len(font_registry), 'pending_commands': len(commands.queue),
+                       'boss_turrets': sum(len(boss.spawned_turrets) for boss in boss_group)}}
+        try:
+            import resource
+            record['rss_peak_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        except ImportError: # Not available on Windows
+            pass
+        if self.snapshot:
+            diff = snapshot.compare_to(self.snapshot, 'lineno')
+            record['frames'] = frames
+            record['net_kb_per_frame'] = sum(stat.size_diff for stat in diff) / 1024 / frames
+            record['top_growth'] = [{'site': str(stat.traceback), 'kb': stat.size_diff // 1024, 'blocks': stat.count_diff}
+                                    for stat in diff[:self.top] if stat.size_diff > 0]
+            record['type_growth'] = dict(sorted(((name, count - self.types.get(name, 0)) for name, count in types.items()
+                                                 if count != self.types.get(name, 0)), key=lambda item: -abs(item[1]))[:self.top])
+        self.snapshot, self.types, self.frame = snapshot, types, sim_frame
+        with open(self.path, 'a') as f: f.write(json.dumps(record) + "\n")
+
+memory_report = MemoryReport(launch_options.memory_report) if launch_options.memory_report else None
 
 # Optimized Trail using image blitting
 trail_particle_cache = {}
@@ -140,71 +652,166 @@ def get_trail_particle(radius, color, alpha):
     if key not in trail_particle_cache:
         surf = pygame.Surface((radius*2, radius*2), pygame.SRCALPHA)
         pygame.draw.circle(surf, (*color, alpha), (radius, radius), radius)
-        trail_particle_cache[key] = surf
+        trail_particle_cache[key] = bake_surface(surf, opaque=False)
     return trail_particle_cache[key]
 
+# Shared sprite art, baked once per kind and handed to every instance. Never draw onto these surfaces
+sprite_image_cache = {}
+
+def get_bullet_image(color, angle):
+    bucket = round(angle / BULLET_ANGLE_STEP) % (360 // BULLET_ANGLE_STEP)
+    key = ('bullet', color, bucket)
+    if key not in sprite_image_cache:
+        surf = pygame.Surface((12, 4), pygame.SRCALPHA)
+        surf.fill(color)
+        sprite_image_cache[key] = bake_surface(pygame.transform.rotate(surf, bucket * BULLET_ANGLE_STEP))
+    return sprite_image_cache[key]
+
+def draw_enemy_disc(surf, size, color):
+    pygame.draw.circle(surf, color, (size // 2, size // 2), size // 2)
+    pygame.draw.circle(surf, BLACK, (size // 2, size // 2), size // 4)
+
+def draw_enemy_turret(surf, size, color):
+    pygame.draw.rect(surf, color, (0, 0, size, size), border_radius=5)
+    pygame.draw.circle(surf, RED, (size // 2, size // 2), size // 4)
+
+def get_enemy_image(archetype):
+    key = ('enemy', archetype.name)
+    if key not in sprite_image_cache:
+        surf = pygame.Surface((archetype.size, archetype.size), pygame.SRCALPHA)
+        archetype.draw(surf, archetype.size, archetype.color)
+        sprite_image_cache[key] = bake_surface(surf)
+    return sprite_image_cache[key]
+
+def get_boss_image(variant, color):
+    key = ('boss', variant, color)
+    if key not in sprite_image_cache:
+        surf = pygame.Surface((100, 100), pygame.SRCALPHA)
+        if variant == "summoner":
+            pygame.draw.polygon(surf, color, [(50, 0), (100, 50), (50, 100), (0, 50)]) # Rhombus
+            pygame.draw.circle(surf, WHITE, (50, 50), 20)
+        elif variant == "rusher":
+            pygame.draw.polygon(surf, color, [(0, 0), (100, 0), (50, 100)]) # Triangle down
+            pygame.draw.circle(surf, YELLOW, (50, 30), 10)
+        else:
+            pygame.draw.rect(surf, color, surf.get_rect(), border_radius=15)
+            pygame.draw.circle(surf, YELLOW, (50, 50), 20)
+        sprite_image_cache[key] = bake_surface(surf)
+    return sprite_image_cache[key]
+
+def get_powerup_image(type):
+    key = ('powerup', type)
+    if key not in sprite_image_cache:
+        surf = pygame.Surface((24, 24), pygame.SRCALPHA)
+        if type == 'health':
+            pygame.draw.circle(surf, (100, 100, 100), (12, 12), 12)
+            pygame.draw.rect(surf, GREEN, (10, 4, 4, 16));
+            pygame.draw.rect(surf, GREEN, (4, 10, 16, 4))
+        elif type == 'rapid_fire':
+            pygame.draw.circle(surf, GREEN, (12, 12), 12, 3)
+            text = ui_font.render('R', True, GREEN);
+            surf.blit(text, text.get_rect(center=(12, 12)))
+        elif type == 'dash_charge':
+            pygame.draw.polygon(surf, BLUE, [(12, 0), (24, 12), (12, 24), (0, 12)])
+        elif type == 'plasma_ball':
+            pygame.draw.circle(surf, BLUE, (12, 12), 12); pygame.draw.circle(surf, WHITE, (12, 12), 6)
+        sprite_image_cache[key] = bake_surface(surf, opaque=type != 'rapid_fire') # The 'R' is antialiased
+    return sprite_image_cache[key]
+
 class Trail:
+    """ A fading ribbon of dots behind a moving point. Points live in a fixed-capacity ring buffer; the dot sprite for
+        each index at each trail length is looked up once, so draw() is one blits call with no per-point math """
     def __init__(self, color, max_length=15, start_width=10, end_width=2):
-        self.points = []
         self.color = color
         self.max_length = max_length
         self.start_width = start_width
         self.end_width = end_width
+        self.xs, self.ys = [0.0] * max_length, [0.0] * max_length
+        self.start, self.count = 0, 0 # Ring position of the tail and number of points
         self.timer = 0
+        self.sprites = [self.layout(n) for n in range(max_length + 1)]
+
+    def layout(self, n):
+        """ (index, sprite, radius) for the visible dots of an n-point trail, tail first so the head draws on top """
+        dots = []
+        for i in range(n):
+            prog = i / n # 0 at tail, 1 at head
+            radius = int((self.end_width + (self.start_width - self.end_width) * prog) / 2)
+            alpha = int(255 * prog) # Fade out tail entirely
+            if radius < 1 or alpha < 10: continue # Don't draw if fully transparent
+            dots.append((i, get_trail_particle(radius, self.color, alpha), radius))
+        return dots
 
     def update(self, pos):
         # Add points based on distance
-        moved = False
-        if not self.points or pos.distance_to(self.points[-1]) > 5:
-            self.points.append(pygame.math.Vector2(pos))
-            moved = True
-            if len(self.points) > self.max_length:
-                self.points.pop(0) # Maintain max length while moving
+        head = (self.start + self.count - 1) % self.max_length
+        if not self.count or math.hypot(pos.x - self.xs[head], pos.y - self.ys[head]) > 5:
+            if self.count == self.max_length: # Maintain max length while moving
+                self.start = (self.start + 1) % self.max_length
+            else:
+                self.count += 1
+            head = (self.start + self.count - 1) % self.max_length
+            self.xs[head], self.ys[head] = pos.x, pos.y
             self.timer = 0 # Reset idle timer on move
-        
+
         # If not moved for a while, retract
-        if not moved and self.points:
+        elif self.count:
             self.timer += 1
             if self.timer > 10: # Wait 10 frames of idleness before retracting
-                self.points.pop(0)
+                self.start, self.count = (self.start + 1) % self.max_length, self.count - 1
 
     def draw(self, surface, camera):
-        if len(self.points) < 2: return
-        
-        # Draw backward so head is on top
-        for i, point in enumerate(self.points):
-            prog = i / len(self.points) # 0 at tail, 1 at head
-            
-            radius = int((self.end_width + (self.start_width - self.end_width) * prog) / 2)
-            alpha = int(255 * prog) # Fade out tail entirely
-            
-            if radius < 1: continue
-            
-            # Simple optimization: Don't draw if fully transparent
-            if alpha < 10: continue
-
-            particle = get_trail_particle(radius, self.color, alpha)
-            
-            draw_pos = point - camera - pygame.math.Vector2(radius, radius)
-            surface.blit(particle, draw_pos)
-
-
-
-
+        if self.count < 2: return
+        xs, ys, start, capacity = self.xs, self.ys, self.start, self.max_length
+        cx, cy = camera.x, camera.y
+        surface.blits([(sprite, (xs[(start + i) % capacity] - cx - radius, ys[(start + i) % capacity] - cy - radius))
+                       for i, sprite, radius in self.sprites[self.count]], doreturn=False)
+
+
+
+
+
+def get_plasma_image(size):
+    key = ('plasma', size)
+    if key not in sprite_image_cache:
+        surf = pygame.Surface((size * 2, size * 2), pygame.SRCALPHA)
+        pygame.draw.circle(surf, BLUE, (size, size), size)
+        pygame.draw.circle(surf, WHITE, (size, size), size // 2)
+        sprite_image_cache[key] = bake_surface(surf)
+    return sprite_image_cache[key]
+
+PLAYER_IMAGE_SIZE = 30
+
+def get_player_image(angle):
+    """ The ship rotated to the nearest PLAYER_ANGLE_STEP, built on first use and shared by every Player """
+    bucket = round(angle / PLAYER_ANGLE_STEP) % (360 // PLAYER_ANGLE_STEP)
+    key = ('player', bucket)
+    if key not in sprite_image_cache:
+        if 'player_source' not in sprite_image_cache:
+            size = PLAYER_IMAGE_SIZE
+            surf = pygame.Surface((size, size), pygame.SRCALPHA)
+            pygame.draw.polygon(surf, PLAYER_COLOR, [(size, size / 2), (0, 0), (0, size)])
+            pygame.draw.polygon(surf, CYAN, [(size - 5, size / 2), (size - 10, size / 2 - 5), (size - 10, size / 2 + 5)])
+            sprite_image_cache['player_source'] = surf
+        rotated = pygame.transform.rotate(sprite_image_cache['player_source'], bucket * PLAYER_ANGLE_STEP)
+        sprite_image_cache[key] = bake_surface(rotated)
+    return sprite_image_cache[key]
+
+def warm_player_images(budget):
+    """ Bakes up to budget ship angles that are not cached yet. Returns False once every angle is ready """
+    for bucket in range(360 // PLAYER_ANGLE_STEP):
+        if ('player', bucket) in sprite_image_cache: continue
+        if budget <= 0: return True
+        get_player_image(bucket * PLAYER_ANGLE_STEP)
+        budget -= 1
+    return False
 
 class Player(pygame.sprite.Sprite):
     def __init__(self):
         super().__init__()
-        self.image_size = 30
-        self.original_image = pygame.Surface((self.image_size, self.image_size), pygame.SRCALPHA)
-        pygame.draw.polygon(self.original_image, PLAYER_COLOR,
-                            [(self.image_size, self.image_size / 2), (0, 0), (0, self.image_size)])
-        pygame.draw.polygon(self.original_image, CYAN, [(self.image_size - 5, self.image_size / 2),
-                                                        (self.image_size - 10, self.image_size / 2 - 5),
-                                                        (self.image_size - 10, self.image_size / 2 + 5)])
-        self.image = self.original_image
+        self.image_size = PLAYER_IMAGE_SIZE
+        self.image = get_player_image(0)
         self.rect = self.image.get_rect(center=(MAP_WIDTH // 2, MAP_HEIGHT // 2))
-        self.mask = pygame.mask.from_surface(self.image)
         self.pos = pygame.math.Vector2(self.rect.center)
         self.speed, self.angle = 3.5, 0
         self.max_health, self.health = 5, 5
@@ -216,14 +823,8 @@ class Player(pygame.sprite.Sprite):
         self.last_move_direction = pygame.math.Vector2(1, 0)
         self.trail = Trail(CYAN, max_length=25, start_width=12, end_width=2) 
 
-        self.rotated_images = {}
-        for angle in range(360):
-            rotated_image = pygame.transform.rotate(self.original_image, angle)
-            rotated_mask = pygame.mask.from_surface(rotated_image)
-            self.rotated_images[angle] = (rotated_image, rotated_mask)
-
     def rotate(self, camera):
-        mouse_x, mouse_y = pygame.mouse.get_pos()
+        mouse_x, mouse_y = current_input[1], current_input[2]
         rel_x, rel_y = mouse_x - (self.rect.centerx - camera.x), mouse_y - (self.rect.centery - camera.y)
         target_angle = math.degrees(math.atan2(-rel_y, rel_x))
 
@@ -232,21 +833,22 @@ class Player(pygame.sprite.Sprite):
 
         if abs(self.angle - target_angle) > 1: 
             self.angle = target_angle
-            self.image, self.mask = self.rotated_images[self.angle]
+            self.image = get_player_image(self.angle)
             self.rect = self.image.get_rect(center=self.rect.center) 
 
     def shoot_position(self):
         return self.pos + pygame.math.Vector2(self.image_size / 2, 0).rotate(-self.angle)
 
     def update(self, camera):
-        keys = pygame.key.get_pressed()
+        held = current_input[0]
         if self.is_dashing:
             self.pos += self.dash_direction * self.dash_speed
             self.dash_timer -= 1
             if self.dash_timer <= 0: self.is_dashing = False
             create_particles(self.rect.center, 3, CYAN, 1, 2, 10, 20)
         else:
-            move_vec = pygame.math.Vector2(keys[K_d] - keys[K_a], keys[K_s] - keys[K_w])
+            move_vec = pygame.math.Vector2(bool(held & INPUT_RIGHT) - bool(held & INPUT_LEFT),
+                                           bool(held & INPUT_DOWN) - bool(held & INPUT_UP))
             if move_vec.length_squared() > 0:
                 move_vec.normalize_ip();
                 self.pos += move_vec * self.speed
@@ -266,21 +868,20 @@ class Player(pygame.sprite.Sprite):
 
     def dash(self):
         if self.dash_charges > 0 and not self.is_dashing:
-            global screen_shake
             self.is_dashing, self.dash_timer, self.dash_charges = True, self.dash_duration, self.dash_charges - 1
             self.dash_direction = self.last_move_direction if self.last_move_direction.length_squared() > 0 else pygame.math.Vector2(1, 0).rotate(-self.angle)
-            screen_shake = 15
+            commands.shake(15)
 
     def handle_reloading(self):
-        if self.ammo <= 0 and not self.reloading: self.reloading, self.reload_start_time = True, pygame.time.get_ticks()
-        if self.reloading and pygame.time.get_ticks() - self.reload_start_time >= self.reload_time: self.ammo, self.reloading = self.max_ammo, False
+        if self.ammo <= 0 and not self.reloading: self.reloading, self.reload_start_time = True, sim_ticks()
+        if self.reloading and sim_ticks() - self.reload_start_time >= self.reload_time: self.ammo, self.reloading = self.max_ammo, False
 
     def handle_powerups(self):
-        if self.rapid_fire_active and pygame.time.get_ticks() > self.rapid_fire_end_time: self.rapid_fire_active = False
+        if self.rapid_fire_active and sim_ticks() > self.rapid_fire_end_time: self.rapid_fire_active = False
 
     def can_shoot(self):
         cooldown = 40 if self.rapid_fire_active else 120
-        return pygame.time.get_ticks() - self.last_shot_time > cooldown and self.ammo > 0 and not self.reloading
+        return sim_ticks() - self.last_shot_time > cooldown and self.ammo > 0 and not self.reloading
 
     def take_damage(self, amount):
         if adv_settings['infinite_health']: return False
@@ -290,28 +891,131 @@ class Player(pygame.sprite.Sprite):
         return False
 
 class Bullet(pygame.sprite.Sprite):
-    def __init__(self, pos, angle, is_enemy=False, color=YELLOW):
+    """ A player bullet; enemy fire lives in EnemyBulletBuffer """
+    def __init__(self, pos, angle):
         super().__init__()
-        self.is_enemy, self.color = is_enemy, color if is_enemy else YELLOW
-        self.image = pygame.Surface((12, 4), pygame.SRCALPHA)
-        self.image.fill(self.color)
-        self.image = pygame.transform.rotate(self.image, angle)
+        self.image = get_bullet_image(YELLOW, angle)
         self.rect, self.pos = self.image.get_rect(center=pos), pygame.math.Vector2(pos)
         self.velocity = pygame.math.Vector2(10, 0).rotate(-angle)
 
     def update(self):
         self.pos += self.velocity;
         self.rect.center = self.pos
-        # create_particles(self.rect.center, 1, self.color, 0.5, 1, 5, 10) # Removed for performance
-        if not pygame.Rect(0, 0, MAP_WIDTH, MAP_HEIGHT).contains(self.rect): self.kill()
+        # create_particles(self.rect.center, 1, YELLOW, 0.5, 1, 5, 10) # Removed for performance
+        if not MAP_RECT.contains(self.rect): commands.kill(self)
+
+    def swept_body(self):
+        """ The segment the bullet's centerline covered this tick, tail of the old position to nose of the new one """
+        nose = self.velocity.normalize() * BULLET_HALF_LENGTH
+        return self.pos - self.velocity - nose, self.pos + nose
+
+bullet_palette, bullet_palette_index = [], {}
+
+class EnemyBulletBuffer:
+    """ All enemy bullets as NumPy arrays: batched movement, culling, player hits and drawing """
+    def __init__(self, capacity=4096):
+        self.count = 0
+        self.pos = np.zeros((capacity, 2), np.float32)
+        self.vel = np.zeros((capacity, 2), np.float32)
+        self.half = np.zeros((capacity, 2), np.float32) # Half extents of the rotated 12x4 bullet rect
+        self.sprite = np.zeros(capacity, np.int32) # palette index * buckets + angle bucket
+        self.sprite_table = {}
+
+    def __len__(self):
+        return self.count
+
+    def grow(self, needed):
+        capacity = len(self.pos)
+        while capacity < needed: capacity *= 2
+        for name in ('pos', 'vel', 'half', 'sprite'):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def emit(self, pos, angles, color):
+        """ Fires one bullet per angle (degrees, same convention as Bullet) from pos """
+        angles = np.atleast_1d(np.asarray(angles, np.float64))
+        count = len(angles)
+        if self.count + count > len(self.pos): self.grow(self.count + count)
+        if color not in bullet_palette_index:
+            bullet_palette_index[color] = len(bullet_palette)
+            bullet_palette.append(color)
+        new = slice(self.count, self.count + count)
+        rad = np.radians(angles)
+        cos, sin = np.cos(rad), np.sin(rad)
+        self.pos[new] = (pos[0], pos[1])
+        self.vel[new, 0], self.vel[new, 1] = cos * 10, -sin * 10
+        self.half[new, 0] = (12 * np.abs(cos) + 4 * np.abs(sin)) / 2
+        self.half[new, 1] = (12 * np.abs(sin) + 4 * np.abs(cos)) / 2
+        buckets = 360 // BULLET_ANGLE_STEP
+        self.sprite[new] = bullet_palette_index[color] * buckets + np.round(angles / BULLET_ANGLE_STEP).astype(np.int32) % buckets
+        self.count += count
+
+    def keep(self, mask):
+        keep = np.flatnonzero(mask)
+        for arr in (self.pos, self.vel, self.half, self.sprite):
+            arr[:len(keep)] = arr[keep]
+        self.count = len(keep)
+
+    def update(self):
+        n = self.count
+        if not n: return
+        self.pos[:n] += self.vel[:n]
+        low, high = self.pos[:n] - self.half[:n], self.pos[:n] + self.half[:n]
+        inside = (low[:, 0] >= 0) & (low[:, 1] >= 0) & (high[:, 0] <= MAP_WIDTH) & (high[:, 1] <= MAP_HEIGHT)
+        if not inside.all(): self.keep(inside)
+
+    def collide(self, rect, radius):
+        """ Removes every bullet that hit the target this tick and returns their centers. Bullets faster than
+            SWEEP_MIN_STEP are tested as capsules over their whole step against a circle of radius at rect.center,
+            slower ones by overlap with rect """
+        n = self.count
+        if not n: return []
+        pos, vel = self.pos[:n], self.vel[:n]
+        gap = np.abs(pos - rect.center)
+        hit = (gap[:, 0] < self.half[:n, 0] + rect.width / 2) & (gap[:, 1] < self.half[:n, 1] + rect.height / 2)
+        speed = np.sqrt((vel * vel).sum(axis=1))
+        fast = speed > SWEEP_MIN_STEP
+        if fast.any():
+            nose = vel / np.maximum(speed, 1e-9)[:, None] * BULLET_HALF_LENGTH
+            start, span = pos - vel - nose, vel + nose * 2
+            t = np.clip(((rect.center - start) * span).sum(axis=1) / np.maximum((span * span).sum(axis=1), 1e-9), 0, 1)
+            closest = start + span * t[:, None] - rect.center
+            swept = (closest * closest).sum(axis=1) < (radius + BULLET_HALF_WIDTH) ** 2
+            hit = np.where(fast, swept, hit)
+        if not hit.any(): return []
+        centers = self.pos[:n][hit].tolist()
+        self.keep(~hit)
+        return centers
+
+    def sprite_entry(self, key):
+        color_index, bucket = divmod(key, 360 // BULLET_ANGLE_STEP)
+        image = get_bullet_image(bullet_palette[color_index], bucket * BULLET_ANGLE_STEP)
+        self.sprite_table[key] = entry = (image, image.get_width() // 2, image.get_height() // 2)
+        return entry
+
+    def draw(self, surface, camera, alpha=1.0):
+        n = self.count
+        if not n: return 0
+        lag = 1.0 - alpha
+        x = (self.pos[:n, 0] - self.vel[:n, 0] * lag - camera.x).astype(np.int32)
+        y = (self.pos[:n, 1] - self.vel[:n, 1] * lag - camera.y).astype(np.int32)
+        width, height = surface.get_size()
+        visible = (x > -10) & (x < width + 10) & (y > -10) & (y < height + 10)
+        if not visible.any(): return 0
+        lookup, batch = self.sprite_table.get, []
+        for key, px, py in zip(self.sprite[:n][visible].tolist(), x[visible].tolist(), y[visible].tolist()):
+            image, ox, oy = lookup(key) or self.sprite_entry(key)
+            batch.append((image, (px - ox, py - oy)))
+        surface.blits(batch, doreturn=False)
+        return len(batch)
 
 class PlasmaBall(pygame.sprite.Sprite):
     def __init__(self, pos, angle):
         super().__init__()
         self.size = 30
-        self.image = pygame.Surface((self.size * 2, self.size * 2), pygame.SRCALPHA)
-        pygame.draw.circle(self.image, BLUE, (self.size, self.size), self.size)
-        pygame.draw.circle(self.image, WHITE, (self.size, self.size), self.size // 2)
+        self.image = get_plasma_image(self.size)
         self.rect, self.pos = self.image.get_rect(center=pos), pygame.math.Vector2(pos)
         self.velocity, self.explosion_radius = pygame.math.Vector2(5, 0).rotate(-angle), 200
 
@@ -319,200 +1023,375 @@ class PlasmaBall(pygame.sprite.Sprite):
         self.pos += self.velocity;
         self.rect.center = self.pos
         create_particles(self.rect.center, 3, BLUE, 1, 2, 15, 25)
-        if not pygame.Rect(0, 0, MAP_WIDTH, MAP_HEIGHT).contains(self.rect): self.kill()
+        if not MAP_RECT.contains(self.rect): commands.kill(self)
 
     def explode(self):
-        global screen_shake, score
-        screen_shake = 30;
+        global score
+        commands.shake(30)
         create_particles(self.rect.center, 100, BLUE, 2, 8, 40, 80)
-        for enemy in enemies.sprites() + boss_group.sprites():
-            if self.pos.distance_to(enemy.rect.center) < self.explosion_radius:
-                if enemy.take_damage(10): score += enemy.score_value
-        self.kill()
+        for enemy in enemy_hash.query_radius(self.pos, self.explosion_radius):
+            if enemy.take_damage(10): score += enemy.score_value
+        commands.kill(self)
+
+def get_beam_tile(width, bucket):
+    """ A BEAM_TILE_LENGTH slice of beam body, pre-rotated. Beams are drawn as a row of these plus two end caps """
+    key = ('beam', width, bucket)
+    if key not in sprite_image_cache:
+        surf = pygame.Surface((BEAM_TILE_LENGTH, width), pygame.SRCALPHA)
+        center_y = width // 2
+        surf.fill(PURPLE)
+        pygame.draw.rect(surf, CYAN, (0, center_y - width // 4, BEAM_TILE_LENGTH, width // 2))
+        pygame.draw.rect(surf, WHITE, (0, center_y - width // 8, BEAM_TILE_LENGTH, width // 4))
+        sprite_image_cache[key] = bake_surface(pygame.transform.rotate(surf, bucket * BEAM_ANGLE_STEP))
+    return sprite_image_cache[key]
+
+def get_beam_cap(width):
+    key = ('beam_cap', width)
+    if key not in sprite_image_cache:
+        surf = pygame.Surface((width, width), pygame.SRCALPHA)
+        pygame.draw.circle(surf, PURPLE, (width // 2, width // 2), width // 2)
+        pygame.draw.circle(surf, CYAN, (width // 2, width // 2), width // 4)
+        pygame.draw.circle(surf, WHITE, (width // 2, width // 2), width // 8)
+        sprite_image_cache[key] = bake_surface(surf)
+    return sprite_image_cache[key]
 
 class EnergyBeam(pygame.sprite.Sprite):
+    """ A capsule (segment plus radius) centered on pos. Hit-tested analytically and drawn from shared rotated tiles """
     def __init__(self, pos, angle, length, width):
         super().__init__()
-        unrotated_surf = pygame.Surface((length, width), pygame.SRCALPHA)
-        center_y = width // 2
-        pygame.draw.rect(unrotated_surf, PURPLE, (0, 0, length, width), border_radius=center_y)
-        pygame.draw.rect(unrotated_surf, CYAN, (0, center_y - width // 4, length, width // 2), border_radius=width // 4)
-        pygame.draw.rect(unrotated_surf, WHITE, (0, center_y - width // 8, length, width // 4),
-                         border_radius=width // 8)
-        self.image = pygame.transform.rotate(unrotated_surf, angle)
-        self.rect, self.mask = self.image.get_rect(center=pos), pygame.mask.from_surface(self.image)
+        direction = pygame.math.Vector2(1, 0).rotate(-angle)
+        self.width, self.radius = width, width / 2
+        # The body is a whole number of abutting tiles; overlapping tiles would double-blend while the beam fades
+        tiles = max(1, round((length - width) / BEAM_TILE_LENGTH))
+        length = tiles * BEAM_TILE_LENGTH + width
+        self.start, self.end = pygame.math.Vector2(pos) - direction * (length / 2), pygame.math.Vector2(pos) + direction * (length / 2)
+        self.rect = pygame.Rect(min(self.start.x, self.end.x), min(self.start.y, self.end.y),
+                                abs(self.end.x - self.start.x), abs(self.end.y - self.start.y)).inflate(width, width)
+        self.bucket = round(angle / BEAM_ANGLE_STEP) % (180 // BEAM_ANGLE_STEP) # A beam looks the same turned 180 degrees
+
+        body_start = self.start + direction * self.radius
+        self.tile_centers = [body_start + direction * (BEAM_TILE_LENGTH * (i + 0.5)) for i in range(tiles)]
+        self.cap_centers = [body_start, self.end - direction * self.radius]
         self.lifespan, self.max_lifespan, self.damage = 30, 30, 2
 
     def update(self):
         self.lifespan -= 1
-        if self.lifespan <= 0: self.kill()
-        self.image.set_alpha(int(255 * (self.lifespan / self.max_lifespan)))
+        if self.lifespan <= 0: commands.kill(self)
+
+    def hits(self, point, radius):
+        """ Point-to-segment distance against the beam's half width plus the target's radius """
+        segment = self.end - self.start
+        t = max(0.0, min(1.0, (point - self.start).dot(segment) / segment.length_squared()))
+        return (self.start + segment * t).distance_squared_to(point) < (self.radius + radius) ** 2
+
+    def draw(self, surface, view, view_rect):
+        if not view_rect.clipline(self.start, self.end): return 0
+        # The tiles are shared, so fade is applied right before this beam's blits
+        alpha = int(255 * (self.lifespan / self.max_lifespan))
+        tile, cap = get_beam_tile(self.width, self.bucket), get_beam_cap(self.width)
+        tile.set_alpha(alpha); cap.set_alpha(alpha)
+        tile_w, tile_h = tile.get_size()
+        batch = [(tile, (c.x - tile_w / 2 - view.x, c.y - tile_h / 2 - view.y)) for c in self.tile_centers]
+        batch += [(cap, (c.x - self.radius - view.x, c.y - self.radius - view.y)) for c in self.cap_centers]
+        surface.blits(batch, doreturn=False)
+        return 1
 
 class Enemy(pygame.sprite.Sprite):
     def __init__(self, x, y, enemy_type):
         super().__init__()
-        self.enemy_type = enemy_type
-        if enemy_type != "boss":
-            if enemy_type == "charger":
-                size, self.color, self.speed, self.health, self.score_value = 32, RED, 1.7, 3, 10
-            elif enemy_type == "shooter":
-                size, self.color, self.speed, self.health, self.score_value = 28, ORANGE, 1.0, 2, 15
-            elif enemy_type == "sniper":
-                size, self.color, self.speed, self.health, self.score_value = 30, PURPLE, 0.7, 4, 30
-            elif enemy_type == "tank":
-                size, self.color, self.speed, self.health, self.score_value = 50, (50, 100, 50), 0.5, 12, 50
-            elif enemy_type == "kamikaze":
-                size, self.color, self.speed, self.health, self.score_value = 25, (255, 100, 100), 2.8, 1, 20
-            elif enemy_type == "turret":
-                size, self.color, self.speed, self.health, self.score_value = 40, (100, 100, 100), 0, 8, 40
-            elif enemy_type == "splitter":
-                size, self.color, self.speed, self.health, self.score_value = 35, (0, 255, 200), 1.2, 5, 25
-
-            self.image = pygame.Surface((size, size), pygame.SRCALPHA)
-            if enemy_type == "turret":
-                 pygame.draw.rect(self.image, self.color, (0,0,size,size), border_radius=5)
-                 pygame.draw.circle(self.image, RED, (size//2, size//2), size//4)
-            else:
-                 pygame.draw.circle(self.image, self.color, (size // 2, size // 2), size // 2)
-                 pygame.draw.circle(self.image, BLACK, (size // 2, size // 2), size // 4)
+        self.enemy_type, self.archetype = enemy_type, ENEMY_ARCHETYPES.get(enemy_type) # None for bosses
+        archetype = self.archetype
+        if archetype:
+            self.color, self.speed, self.health, self.score_value = archetype.color, archetype.speed, archetype.health, archetype.score_value
+            self.image = get_enemy_image(archetype)
             self.rect, self.pos = self.image.get_rect(center=(x, y)), pygame.math.Vector2(x, y)
 
+            # Batched steering (EnemyGroup.update): steer_speed toward the player beyond steer_far, away inside steer_near.
+            # The archetype's think() runs on tick think_at, or on any tick the player is closer than wake_dist
+            self.steer_speed, self.steer_near, self.steer_far = self.speed, archetype.steer_near, archetype.steer_far
+            self.think_at, self.wake_dist = math.inf, archetype.wake_dist
+
         # Apply Advanced Settings
         if hasattr(self, 'health'):
              self.health = int(self.health * adv_settings['enemy_health'])
              self.score_value = int(self.score_value * adv_settings['enemy_health']) # More health = more score
         
         # Apply Cooldown Multiplier (Fire Rate)
-        cd_mult = adv_settings['enemy_firerate']
-        
-        if enemy_type == "shooter":
-            self.shoot_timer, self.shoot_cooldown = random.randint(0, 150), int(150 * cd_mult)
-        elif enemy_type == "tank":
-            self.shoot_timer, self.shoot_cooldown = random.randint(0, 200), int(200 * cd_mult)
-        elif enemy_type == "turret":
-            self.cooldown_timer = int(90 * cd_mult)
-            self.lifespan = 900 # 15 seconds at 60 FPS
-        elif enemy_type == "sniper":
-            self.state, self.aim_timer, self.aim_duration = "roaming", 0, int(120 * cd_mult)
-            # Warn/Cooldown not strictly fire rate but pacing
-            self.warn_timer, self.warn_duration, self.locked_target_pos = 0, 90, None
-            self.cooldown_timer, self.cooldown_duration = 0, 120
-
-    def update(self, player, all_sprites_group):
-        direction = player.pos - self.pos;
-        dist = direction.length()
-        if dist == 0: return
-
-        if self.enemy_type == "charger":
-            self.pos += direction.normalize() * self.speed
-        elif self.enemy_type == "kamikaze":
-             self.pos += direction.normalize() * self.speed
-             if dist < 30: # explode on contact
-                 self.kill()
-                 create_particles(self.rect.center, 20, RED, 2, 8, 20, 50)
-                 player.take_damage(1)
-        elif self.enemy_type == "shooter":
-            desired_dist = 400
-            if dist > desired_dist:
-                self.pos += direction.normalize() * self.speed
-            elif dist < desired_dist - 50:
-                self.pos -= direction.normalize() * self.speed
-            self.shoot_timer += 1
-            if self.shoot_timer >= self.shoot_cooldown:
-                self.shoot_timer = 0
-                bullets.add(
-                    Bullet(self.rect.center, math.degrees(math.atan2(-direction.y, direction.x)), True, self.color))
-        elif self.enemy_type == "tank":
-            if dist > 300: self.pos += direction.normalize() * self.speed
-            self.shoot_timer += 1
-            if self.shoot_timer >= self.shoot_cooldown:
-                self.shoot_timer = 0
-                angle = math.degrees(math.atan2(-direction.y, direction.x))
-                for offset in [-15, 0, 15]:
-                    bullets.add(Bullet(self.rect.center, angle + offset, True, self.color))
-        elif self.enemy_type == "turret":
-            self.update_turret(player, direction, dist, bullets)
-            self.lifespan -= 1
-            if self.lifespan <= 0: self.kill()
-        elif self.enemy_type == "splitter":
-            self.update_splitter(player, direction, dist)
-        elif self.enemy_type == "sniper":
-            self.update_sniper(player, direction, dist, all_sprites_group)
-        self.rect.center = self.pos
-
-    def update_sniper(self, player, direction, dist, all_sprites_group):
-        if self.state == "roaming":
-            if dist > 0: 
-                self.pos += direction.normalize() * (self.speed * 0.5) 
-            if dist < 900: self.state, self.aim_timer = "aiming", self.aim_duration
-        elif self.state == "aiming":
-            self.aim_timer -= 1
-            if self.aim_timer <= 0: self.locked_target_pos, self.state, self.warn_timer = player.pos.copy(), "warning", self.warn_duration
-        elif self.state == "warning":
-            self.warn_timer -= 1
-            if self.warn_timer <= 0:
-                if self.locked_target_pos:
-                    create_particles(self.rect.center, 40, PURPLE, 2, 7, 15, 30);
-                    # create_particles(self.rect.center, 20, WHITE, 1, 4, 10, 20)
-                    beam_dir = self.locked_target_pos - self.pos
-                    # Beam length and width can be optimized
-                    beam = EnergyBeam(self.pos + beam_dir.normalize() * 1000,
-                                      math.degrees(math.atan2(-beam_dir.y, beam_dir.x)), 2000, 40)
-                    all_sprites_group.add(beam);
-                    beams.add(beam)
-                self.state, self.cooldown_timer = "cooldown", self.cooldown_duration
-        elif self.state == "cooldown":
-            self.cooldown_timer -= 1
-            if self.cooldown_timer <= 0: self.state = "roaming"
-
-    def update_turret(self, player, direction, dist, bullets):
-        # Turret rotates slowly towards player and shoots heavy shots
-        if dist < 600:
-             self.cooldown_timer -= 1
-             if self.cooldown_timer <= 0:
-                 self.cooldown_timer = 90
-                 angle = math.degrees(math.atan2(-direction.y, direction.x))
-                 bullets.add(Bullet(self.rect.center, angle, True, self.color))
-                 bullets.add(Bullet(self.rect.center, angle+10, True, self.color))
-                 bullets.add(Bullet(self.rect.center, angle-10, True, self.color))
-
-    def update_splitter(self, player, direction, dist):
-        self.pos += direction.normalize() * self.speed
+        if archetype and archetype.setup: archetype.setup(self, adv_settings['enemy_firerate'])
 
     def take_damage(self, amount):
-        global enemies
         self.health -= amount
         if self.health <= 0: 
-            if self.enemy_type == "splitter":
-                # Split into 2 small chargers
-                for _ in range(2):
-                    offset = pygame.math.Vector2(random.uniform(-20, 20), random.uniform(-20, 20))
-                    enemies.add(Enemy(self.pos.x + offset.x, self.pos.y + offset.y, "charger"))
-            self.kill(); 
+            if self.archetype and self.archetype.on_death: self.archetype.on_death(self)
+            commands.kill(self)
             return True
         return False
 
+class EnemyGroup(pygame.sprite.Group):
+    """ The regular enemies. Their positions and steering fields live in NumPy rows kept in group order,
+        so update() moves everyone in one pass and only runs archetype think hooks for the enemies that are due """
+    def __init__(self, capacity=256):
+        self.members, self.removed = [], False
+        self.pos = np.zeros((capacity, 2)) # Authoritative; copied to each enemy's pos and rect every update
+        self.steering = np.zeros((capacity, 5)) # steer_speed, steer_near, steer_far, wake_dist, think_at
+        super().__init__()
+
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite, layer)
+        row = len(self.members)
+        if row == len(self.pos):
+            self.pos, self.steering = (np.concatenate([array, np.zeros_like(array)]) for array in (self.pos, self.steering))
+        self.members.append(sprite)
+        sprite.row = row
+        self.pos[row] = sprite.pos
+        self.sync(sprite)
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        self.members[sprite.row], self.removed = None, True
+
+    def sync(self, enemy):
+        self.steering[enemy.row] = (enemy.steer_speed, enemy.steer_near, enemy.steer_far, enemy.wake_dist, enemy.think_at)
+
+    def compact(self):
+        """ Drops the rows of removed enemies, keeping the rest in order """
+        keep = [row for row, enemy in enumerate(self.members) if enemy is not None]
+        count = len(keep)
+        self.pos[:count], self.steering[:count] = self.pos[keep], self.steering[keep]
+        self.members = [self.members[row] for row in keep]
+        for row, enemy in enumerate(self.members): enemy.row = row
+        self.removed = False
+
+    def crowd_steering(self, pos, target):
+        """ Samples this tick's flow field at each enemy's FLOW_CELL_SIZE cell: a unit vector from the cell toward target,
+            bent away from the crowd slope there. Also returns each enemy's separation push away from the centroid of the
+            other enemies in its 3x3 cell neighborhood """
+        cells = max(2, math.ceil(current_map_size / FLOW_CELL_SIZE))
+        origin = np.array([(MAP_WIDTH - current_map_size) / 2, (MAP_HEIGHT - current_map_size) / 2])
+        cell_xy = np.clip(((pos - origin) // FLOW_CELL_SIZE).astype(np.intp), 0, cells - 1)
+        cx, cy = cell_xy[:, 0], cell_xy[:, 1]
+
+        if len(pos) < FLOW_GRID_MIN_ENEMIES: # Pairwise cell offsets, so the cost follows the enemy count
+            off_x, off_y = cx[None, :] - cx[:, None], cy[None, :] - cy[:, None]
+            near_x, near_y = np.abs(off_x) <= 1, np.abs(off_y) <= 1
+            crowd, sums = (near_x & near_y).sum(axis=1), (near_x & near_y) @ pos
+            slope = 0.5 * np.stack([(np.sign(off_x) * ((np.abs(off_x) <= 2) & near_y)).sum(axis=1),
+                                    (np.sign(off_y) * ((np.abs(off_y) <= 2) & near_x)).sum(axis=1)], axis=1)
+        else: # Same sums from 3x3 windows over the binned grid; padded by 2 so the slope can look one cell past the edge
+            size = cells + 4
+            cell = (cx + 2) * size + cy + 2
+            grid = np.stack([np.bincount(cell, values, size * size) for values in (None, pos[:, 0], pos[:, 1])]).reshape(3, size, size)
+            window = sum(grid[:, dx:dx + cells + 2, dy:dy + cells + 2] for dx in range(3) for dy in range(3))
+            crowd, sums = window[0, cx + 1, cy + 1], window[1:, cx + 1, cy + 1].T
+            slope = 0.5 * np.stack([window[0, cx + 2, cy + 1] - window[0, cx, cy + 1],
+                                    window[0, cx + 1, cy + 2] - window[0, cx + 1, cy]], axis=1)
+
+        to = (target[0], target[1]) - (origin + (cell_xy + 0.5) * FLOW_CELL_SIZE)
+        to /= np.maximum(np.sqrt(to[:, 0] * to[:, 0] + to[:, 1] * to[:, 1]), 1)[:, None]
+        slope /= np.maximum(np.sqrt(slope[:, 0] * slope[:, 0] + slope[:, 1] * slope[:, 1]), 1)[:, None] # Clamped to unit length
+        flow = to - CROWD_AVOIDANCE * slope
+        flow /= np.maximum(np.sqrt(flow[:, 0] * flow[:, 0] + flow[:, 1] * flow[:, 1]), 1e-9)[:, None]
+
+        others = crowd - 1
+        away = (pos * crowd[:, None] - sums) / np.maximum(others, 1)[:, None] # pos minus the neighbors' centroid
+        gap = np.sqrt(away[:, 0] * away[:, 0] + away[:, 1] * away[:, 1])
+        push = np.where((others > 0) & (gap > 0), SEPARATION_SPEED * np.clip(1 - gap / SEPARATION_RADIUS, 0, 1) / np.maximum(gap, 1e-9), 0)
+        return flow, away * push[:, None]
+
+    def update(self, player, all_sprites_group):
+        if self.removed: self.compact()
+        count = len(self.members)
+        if count == 0: return
+        pos = self.pos[:count]
+        speed, near, far, wake_dist, think_at = self.steering[:count].T
+        direction = (player.pos.x, player.pos.y) - pos
+        dist = np.sqrt(direction[:, 0] * direction[:, 0] + direction[:, 1] * direction[:, 1])
+        moving = dist > 0 # An enemy sitting exactly on the player does nothing this tick
+
+        flow, separation = self.crowd_steering(pos, player.pos)
+        heading = np.where((dist < FLOW_DIRECT_RANGE)[:, None], direction / np.where(moving, dist, 1)[:, None], flow)
+        step = speed * ((dist > far).astype(np.float64) - (dist < near)) # Toward, away or hold
+        pos += heading * np.where(moving, step, 0)[:, None] + separation * (speed > 0)[:, None]
+        due = (moving & ((think_at <= sim_frame) | (dist < wake_dist))).tolist()
+
+        # think sees the rect from before the move, like the per-sprite update it replaced
+        for row, (enemy, xy, is_due) in enumerate(zip(self.members, pos.tolist(), due)):
+            enemy.pos.xy = xy
+            if is_due:
+                enemy.archetype.think(enemy, player, pygame.math.Vector2(direction[row].tolist()), float(dist[row]), all_sprites_group)
+                if enemy.alive(): self.sync(enemy)
+            enemy.rect.center = xy
+
+# Enemy archetype hooks. setup(enemy, cooldown_mult) runs at spawn, think(enemy, player, direction, dist,
+# all_sprites_group) when EnemyGroup.update finds the enemy due (direction/dist are from before this tick's move),
+# on_death(enemy) when it is killed and telegraph(enemy, view, view_rect) while drawing
+def setup_gunner(enemy, cooldown_mult):
+    enemy.shoot_cooldown = int(enemy.archetype.fire_cooldown * cooldown_mult)
+    enemy.think_at = sim_frame + max(1, enemy.shoot_cooldown - random.randint(0, enemy.archetype.fire_cooldown))
+
+def think_gunner(enemy, player, direction, dist, all_sprites_group):
+    enemy.think_at = sim_frame + max(1, enemy.shoot_cooldown)
+    angle = math.degrees(math.atan2(-direction.y, direction.x))
+    enemy_bullets.emit(enemy.rect.center, [angle + offset for offset in enemy.archetype.spread], enemy.color)
+
+def think_kamikaze(enemy, player, direction, dist, all_sprites_group):
+    # Woken by wake_dist: explode on contact
+    commands.kill(enemy)
+    create_particles(enemy.rect.center, 20, RED, 2, 8, 20, 50)
+    player.take_damage(1)
+
+def setup_turret(enemy, cooldown_mult):
+    enemy.cooldown_timer = int(90 * cooldown_mult)
+    enemy.think_at = sim_frame + 900 # 15 second lifespan at 60 FPS; the fire cooldown counts down while in wake_dist
+
+def think_turret(enemy, player, direction, dist, all_sprites_group):
+    # Turret rotates slowly towards player and shoots heavy shots
+    if dist < 600:
+         enemy.cooldown_timer -= 1
+         if enemy.cooldown_timer <= 0:
+             enemy.cooldown_timer = 90
+             angle = math.degrees(math.atan2(-direction.y, direction.x))
+             enemy_bullets.emit(enemy.rect.center, [angle + offset for offset in enemy.archetype.spread], enemy.color)
+    if sim_frame >= enemy.think_at: commands.kill(enemy)
+
+def setup_sniper(enemy, cooldown_mult):
+    enemy.state, enemy.aim_duration = "roaming", int(120 * cooldown_mult)
+    # Warn/Cooldown not strictly fire rate but pacing
+    enemy.warn_duration, enemy.locked_target_pos, enemy.cooldown_duration = 90, None, 120
+    enemy.steer_speed = enemy.speed * 0.5
+
+def think_sniper(enemy, player, direction, dist, all_sprites_group):
+    if enemy.state == "roaming": # Woken by wake_dist
+        enemy.state, enemy.think_at = "aiming", sim_frame + max(1, enemy.aim_duration)
+        enemy.steer_speed, enemy.wake_dist = 0, -1
+    elif enemy.state == "aiming":
+        enemy.locked_target_pos, enemy.state, enemy.think_at = player.pos.copy(), "warning", sim_frame + enemy.warn_duration
+    elif enemy.state == "warning":
+        if enemy.locked_target_pos:
+            create_particles(enemy.rect.center, 40, PURPLE, 2, 7, 15, 30);
+            # create_particles(enemy.rect.center, 20, WHITE, 1, 4, 10, 20)
+            beam_dir = enemy.locked_target_pos - enemy.pos
+            # Beam length and width can be optimized
+            beam = EnergyBeam(enemy.pos + beam_dir.normalize() * 1000,
+                              math.degrees(math.atan2(-beam_dir.y, beam_dir.x)), 2000, 40)
+            commands.spawn(beam, all_sprites_group, beams)
+        enemy.state, enemy.think_at = "cooldown", sim_frame + enemy.cooldown_duration
+    elif enemy.state == "cooldown":
+        enemy.state, enemy.think_at = "roaming", math.inf
+        enemy.steer_speed, enemy.wake_dist = enemy.speed * 0.5, enemy.archetype.wake_dist
+
+def draw_sniper_telegraph(enemy, view, view_rect):
+    if enemy.state == 'aiming':
+        if not view_rect.clipline(enemy.rect.center, player.pos): return
+        pygame.draw.line(screen, RED, (enemy.rect.centerx - view.x, enemy.rect.centery - view.y),
+                         (player.pos.x - view.x, player.pos.y - view.y), 1)
+    elif enemy.state == 'warning' and (enemy.think_at - sim_frame) % 10 < 5 and view_rect.colliderect(enemy.rect.inflate(enemy.rect.width, enemy.rect.width)):
+        pygame.draw.circle(screen, WHITE, (enemy.rect.centerx - view.x, enemy.rect.centery - view.y),
+                           enemy.rect.width)
+
+def split_into_chargers(enemy):
+    for _ in range(2):
+        offset = pygame.math.Vector2(random.uniform(-20, 20), random.uniform(-20, 20))
+        commands.spawn(Enemy(enemy.pos.x + offset.x, enemy.pos.y + offset.y, "charger"), enemies)
+
+class EnemyArchetype:
+    """ One enemy type: stats, art, how often it spawns, how it steers and its behavior hooks """
+    __slots__ = ('name', 'size', 'color', 'speed', 'health', 'score_value', 'spawn_weight', 'draw', 'steer_near', 'steer_far',
+                 'wake_dist', 'spawns_inside', 'fire_cooldown', 'spread', 'setup', 'think', 'on_death', 'telegraph')
+
+    def __init__(self, name, size, color, speed, health, score_value, spawn_weight, draw=draw_enemy_disc,
+                 steer_near=-1, steer_far=0, wake_dist=-1, spawns_inside=False, fire_cooldown=0, spread=(),
+                 setup=None, think=None, on_death=None, telegraph=None):
+        self.name, self.size, self.color, self.speed, self.health = name, size, color, speed, health
+        self.score_value, self.spawn_weight, self.draw = score_value, spawn_weight, draw
+        self.steer_near, self.steer_far, self.wake_dist, self.spawns_inside = steer_near, steer_far, wake_dist, spawns_inside
+        self.fire_cooldown, self.spread = fire_cooldown, spread
+        self.setup, self.think, self.on_death, self.telegraph = setup, think, on_death, telegraph
+
+# Spawn weights: tank and turret appear less often (~5% each, vs 10-20% for others)
+ENEMY_ARCHETYPES = {archetype.name: archetype for archetype in [
+    EnemyArchetype("charger", 32, RED, 1.7, 3, 10, spawn_weight=4),
+    EnemyArchetype("shooter", 28, ORANGE, 1.0, 2, 15, spawn_weight=4, steer_near=350, steer_far=400, # Keep ~400px away
+                   fire_cooldown=150, spread=(0,), setup=setup_gunner, think=think_gunner),
+    EnemyArchetype("sniper", 30, PURPLE, 0.7, 4, 30, spawn_weight=2, wake_dist=900,
+                   setup=setup_sniper, think=think_sniper, telegraph=draw_sniper_telegraph),
+    EnemyArchetype("kamikaze", 25, (255, 100, 100), 2.8, 1, 20, spawn_weight=4, wake_dist=30, think=think_kamikaze),
+    EnemyArchetype("splitter", 35, (0, 255, 200), 1.2, 5, 25, spawn_weight=2, on_death=split_into_chargers),
+    EnemyArchetype("tank", 50, (50, 100, 50), 0.5, 12, 50, spawn_weight=1, steer_far=300,
+                   fire_cooldown=200, spread=(-15, 0, 15), setup=setup_gunner, think=think_gunner),
+    EnemyArchetype("turret", 40, (100, 100, 100), 0, 8, 40, spawn_weight=1, draw=draw_enemy_turret, wake_dist=600,
+                   spawns_inside=True, spread=(0, 10, -10), setup=setup_turret, think=think_turret),
+]}
+ENEMY_SPAWN_POOL = [name for name, archetype in ENEMY_ARCHETYPES.items() for _ in range(archetype.spawn_weight)]
+
+class WaveDirector:
+    """ Plans the next wave's enemy types and spawn points during the cooldown, then builds it WAVE_SPAWN_BUDGET enemies
+        a tick so a big wave never lands in one frame. on_spawn_frame(wave, ms), if set, hears about every spawning tick """
+    def __init__(self):
+        self.plan, self.planned_wave, self.pending, self.wave = [], None, deque(), 0
+        self.worst_ms, self.worst_wave, self.on_spawn_frame = 0.0, None, None
+
+    def plan_wave(self, wave):
+        map_rect = pygame.Rect((MAP_WIDTH - current_map_size) / 2, (MAP_HEIGHT - current_map_size) / 2,
+                               current_map_size, current_map_size)
+        self.plan, self.planned_wave = [], wave
+        for _ in range(int((2 + wave) * adv_settings['spawn_count_mult'])):
+            enemy_type = random.choice(ENEMY_SPAWN_POOL)
+            if ENEMY_ARCHETYPES[enemy_type].spawns_inside:
+                # Spawn turrets closer to center (random point in map)
+                x = random.uniform(map_rect.left + 200, map_rect.right - 200)
+                y = random.uniform(map_rect.top + 200, map_rect.bottom - 200)
+            else:
+                edge = random.choice(['top', 'bottom', 'left', 'right'])
+                if edge == 'top':
+                    x, y = random.uniform(map_rect.left, map_rect.right), map_rect.top
+                elif edge == 'bottom':
+                    x, y = random.uniform(map_rect.left, map_rect.right), map_rect.bottom
+                elif edge == 'left':
+                    x, y = map_rect.left, random.uniform(map_rect.top, map_rect.bottom)
+                else:
+                    x, y = map_rect.right, random.uniform(map_rect.top, map_rect.bottom)
+            self.plan.append((enemy_type, x, y))
+
+    def start_wave(self, wave):
+        """ Queues the planned wave, planning it now if the cooldown was skipped (Custom Start, benchmarks) """
+        if self.planned_wave != wave: self.plan_wave(wave)
+        self.pending.extend(self.plan)
+        self.plan, self.planned_wave, self.wave = [], None, wave
+
+    def update(self):
+        if not self.pending: return
+        start = time.perf_counter()
+        for _ in range(min(WAVE_SPAWN_BUDGET, len(self.pending))):
+            enemy_type, x, y = self.pending.popleft()
+            enemies.add(Enemy(x, y, enemy_type))
+        ms = (time.perf_counter() - start) * 1000
+        if ms > self.worst_ms: self.worst_ms, self.worst_wave = ms, self.wave
+        if self.on_spawn_frame: self.on_spawn_frame(self.wave, ms)
+
+    def report(self):
+        return {'worst_ms': self.worst_ms, 'worst_wave': self.worst_wave}
+
+    def reset(self):
+        self.plan, self.planned_wave, self.wave = [], None, 0
+        self.pending.clear()
+
+wave_director = WaveDirector()
+
 class Boss(Enemy):
     def __init__(self, x, y, variant_override=None):
         super().__init__(x, y, "boss")
-        self.image = pygame.Surface((100, 100), pygame.SRCALPHA)
         self.boss_variant = variant_override if variant_override else random.choice(["standard", "summoner", "rusher"])
         
         self.enemy_type = "boss"
         self.color = (200, 0, 0)
-        self.rect, self.pos = self.image.get_rect(center=(x, y)), pygame.math.Vector2(x, y)
-        
         if self.boss_variant == "summoner": 
             self.color = (138, 43, 226) # Blue Violet
-            pygame.draw.polygon(self.image, self.color, [(50, 0), (100, 50), (50, 100), (0, 50)]) # Rhombus
-            pygame.draw.circle(self.image, WHITE, (50, 50), 20)
         elif self.boss_variant == "rusher": 
             self.color = (255, 69, 0) # Red Orange
-            pygame.draw.polygon(self.image, self.color, [(0, 0), (100, 0), (50, 100)]) # Triangle down
-            pygame.draw.circle(self.image, YELLOW, (50, 30), 10)
-        else:
-            pygame.draw.rect(self.image, self.color, self.image.get_rect(), border_radius=15)
-            pygame.draw.circle(self.image, YELLOW, (50, 50), 20)
+        self.image = get_boss_image(self.boss_variant, self.color)
+        self.rect, self.pos = self.image.get_rect(center=(x, y)), pygame.math.Vector2(x, y)
+        self.tick_start = pygame.math.Vector2(x, y) # Where update() found it; the contact pass sweeps from here
 
         self.health, self.max_health, self.score_value = 330, 330, 1000  
         # Apply Adv Settings to Boss
@@ -547,10 +1426,11 @@ class Boss(Enemy):
             self.stage = new_stage
             self.update_stage_attributes()
             create_particles(self.rect.center, 100, YELLOW, 3, 8, 30, 60);
-            screen_shake = 20
+            commands.shake(20)
         return False
 
     def update(self, player, all_sprites_group):
+        self.tick_start = pygame.math.Vector2(self.pos)
         direction = player.pos - self.pos
         if direction.length() == 0: return
 
@@ -564,22 +1444,18 @@ class Boss(Enemy):
             if self.boss_variant == "summoner":
                 if self.action_timer % 300 == 0:
                     # Clear dead turrets from group
-                    for t in list(self.spawned_turrets):
+                    for t in self.spawned_turrets:
                         if not t.alive(): self.spawned_turrets.remove(t)
 
                     # Spawn Turrets if under limit (Limit: 3 * Stage)
                     if len(self.spawned_turrets) < self.stage * 3:
                         for _ in range(self.stage):
                              ex, ey = self.pos.x + random.randint(-200, 200), self.pos.y + random.randint(-200, 200)
-                             turret = Enemy(ex, ey, "turret")
-                             enemies.add(turret)
-                             self.spawned_turrets.add(turret)
+                             commands.spawn(Enemy(ex, ey, "turret"), enemies, self.spawned_turrets)
                 
                 # Orbiting shield balls (visual only for now or projectiles)
                 if self.action_timer % 120 == 0:
-                     for i in range(8):
-                         angle = i * 45 + self.action_timer
-                         bullets.add(Bullet(self.rect.center, angle, True, CYAN))
+                     enemy_bullets.emit(self.rect.center, [i * 45 + self.action_timer for i in range(8)], CYAN)
 
             elif self.boss_variant == "rusher":
                 if not self.is_rushing:
@@ -594,8 +1470,8 @@ class Boss(Enemy):
                     if rush_dir.length() < 20 or self.action_timer % 200 > 60: # Stop after frame count or reach
                         self.is_rushing = False
                         # Explosion of bullets on stop
-                        for i in range(24): bullets.add(Bullet(self.rect.center, i*15, True, RED))
-                        screen_shake = 20
+                        enemy_bullets.emit(self.rect.center, [i * 15 for i in range(24)], RED)
+                        commands.shake(20)
                     else:
                         self.pos += rush_dir.normalize() * (self.speed * 5) # FAST
                         self.rect.center = self.pos # Update rect for collision immediately
@@ -609,10 +1485,10 @@ class Boss(Enemy):
                 elif self.stage < 3 and self.action_timer % self.laser_cooldown == 0:
                     self.laser_state, self.laser_aim_timer = "aiming", 120
                 elif self.action_timer % self.nova_cooldown == 0:
-                    for i in range(16): bullets.add(Bullet(self.rect.center, i * 22.5, True, ORANGE))
+                    enemy_bullets.emit(self.rect.center, [i * 22.5 for i in range(16)], ORANGE)
                 elif self.action_timer % self.shoot_cooldown == 0:
                     angle = math.degrees(math.atan2(-direction.y, direction.x))
-                    for i in range(-2, 3): bullets.add(Bullet(self.rect.center, angle + i * 15, True, self.color))
+                    enemy_bullets.emit(self.rect.center, [angle + i * 15 for i in range(-2, 3)], self.color)
 
     def handle_laser_logic(self, player, all_sprites_group):
         if self.laser_state == "aiming":
@@ -627,8 +1503,7 @@ class Boss(Enemy):
                     beam_dir = self.locked_target_pos - self.pos
                     beam = EnergyBeam(self.pos + beam_dir.normalize() * 1000,
                                       math.degrees(math.atan2(-beam_dir.y, beam_dir.x)), 2000, 40)
-                    beams.add(beam);
-                    all_sprites_group.add(beam)
+                    commands.spawn(beam, beams, all_sprites_group)
 
                 if self.stage == 3 and self.triple_laser_count < 2:
                     self.triple_laser_count += 1
@@ -640,25 +1515,13 @@ class PowerUp(pygame.sprite.Sprite):
     def __init__(self, center_pos, type):
         super().__init__()
         self.type = type
-        self.image = pygame.Surface((24, 24), pygame.SRCALPHA)
+        self.image = get_powerup_image(type)
         self.rect = self.image.get_rect(center=center_pos)
-        if type == 'health':
-            pygame.draw.circle(self.image, (100, 100, 100), (12, 12), 12)
-            pygame.draw.rect(self.image, GREEN, (10, 4, 4, 16));
-            pygame.draw.rect(self.image, GREEN, (4, 10, 16, 4))
-        elif type == 'rapid_fire':
-            pygame.draw.circle(self.image, GREEN, (12, 12), 12, 3)
-            text = ui_font.render('R', True, GREEN);
-            self.image.blit(text, text.get_rect(center=(12, 12)))
-        elif type == 'dash_charge':
-            pygame.draw.polygon(self.image, BLUE, [(12, 0), (24, 12), (12, 24), (0, 12)])
-        elif type == 'plasma_ball':
-            pygame.draw.circle(self.image, BLUE, (12, 12), 12); pygame.draw.circle(self.image, WHITE, (12, 12), 6)
 
 class Button:
     def __init__(self, x, y, width, height, text, action=None, font_size=36, toggle_dict=None, toggle_key=None):
         self.rect, self.text, self.action = pygame.Rect(x, y, width, height), text, action
-        self.font = pygame.font.Font("freesansbold.ttf" if "freesansbold.ttf" else None, font_size)
+        self.font = get_font(font_size)
         self.base_color, self.hover_color, self.text_color = (20, 20, 20), (50, 50, 50), WHITE
         self.toggle_dict, self.toggle_key = toggle_dict, toggle_key
 
@@ -668,7 +1531,7 @@ class Button:
         color = self.hover_color if self.rect.collidepoint(pygame.mouse.get_pos()) else self.base_color
         pygame.draw.rect(surface, color, self.rect, border_radius=10)
         pygame.draw.rect(surface, border_color, self.rect, 2, border_radius=10)
-        text_surf = self.font.render(self.text, True, self.text_color)
+        text_surf = render_text(self.font, self.text, self.text_color)
         surface.blit(text_surf, text_surf.get_rect(center=self.rect.center))
 
     def handle_event(self, event):
@@ -678,10 +1541,21 @@ class Button:
             return True
         return False
 
-def start_game(custom=False): global game_state; reset_game(custom); game_state = "game"
+def start_game(custom=False, seed=None):
+    """ Seeds the RNGs (so the game can be recorded and replayed) and starts a new game """
+    global game_state, session_seed, recorder, pending_input
+    finish_recording()
+    pending_input = 0
+    if seed is None: seed = launch_options.seed if launch_options.seed is not None else random.SystemRandom().randrange(2 ** 31)
+    session_seed = seed
+    seed_rngs(seed)
+    reset_game(custom)
+    game_state = "game"
+    if launch_options.record and replay_frames is None:
+        recorder = InputRecorder(launch_options.record, session_header(custom))
 
 def toggle_fullscreen():
-    global fullscreen, screen, WIDTH, HEIGHT, grid_surface
+    global fullscreen, screen, WIDTH, HEIGHT
     fullscreen = not fullscreen
     if fullscreen:
         screen = pygame.display.set_mode((0, 0), pygame.FULLSCREEN) 
@@ -689,7 +1563,6 @@ def toggle_fullscreen():
     else:
         WIDTH, HEIGHT = 1280, 720
         screen = pygame.display.set_mode((WIDTH, HEIGHT), pygame.RESIZABLE)
-    grid_surface = create_grid_surface(WIDTH, HEIGHT, GRID_COLOR) 
     update_ui_positions()
 
 def quit_game(): global running; running = False
@@ -701,9 +1574,17 @@ def toggle_smooth_camera():
     smooth_camera_follow = not smooth_camera_follow
 
 def reset_game(use_custom_settings=False):
-    global player, all_sprites, bullets, enemies, plasma_balls, powerups, particles, beams, boss_group
-    global current_wave, score, wave_timer, boss_fight_active, current_map_size, boss_powerup_spawn_timer
+    global player, all_sprites, bullets, enemy_bullets, enemies, plasma_balls, powerups, particles, beams, boss_group
+    global current_wave, score, wave_timer, boss_fight_active, current_map_size, boss_powerup_spawn_timer, sim_frame
+    sim_frame = 0
     player = Player()
+    all_sprites, enemies, bullets, plasma_balls = pygame.sprite.Group(), EnemyGroup(), pygame.sprite.Group(), pygame.sprite.Group()
+    powerups, beams, boss_group = pygame.sprite.Group(), pygame.sprite.Group(), pygame.sprite.Group()
+    particles, enemy_bullets = ParticleSystem(), EnemyBulletBuffer()
+    commands.clear()
+    wave_director.reset()
+    all_sprites.add(player)
+    score, wave_timer, boss_fight_active, boss_powerup_spawn_timer = 0, 0, False, 0
 
     if use_custom_settings:
         if custom_start_wave_str == "676767":
@@ -719,23 +1600,18 @@ def reset_game(use_custom_settings=False):
         
         if custom_powerups['dash_charge']: player.dash_charges = player.max_dash_charges
         if custom_powerups[
-            'rapid_fire']: player.rapid_fire_active, player.rapid_fire_end_time = True, pygame.time.get_ticks() + 999999
+            'rapid_fire']: player.rapid_fire_active, player.rapid_fire_end_time = True, sim_ticks() + 999999
         if custom_powerups['plasma_ball']: player.has_plasma_ball = True
         current_map_size = 2000
     else:
         current_wave, current_map_size = 0, 2000
 
-    all_sprites, enemies, bullets, plasma_balls = pygame.sprite.Group(), pygame.sprite.Group(), pygame.sprite.Group(), pygame.sprite.Group()
-    powerups, particles, beams, boss_group = pygame.sprite.Group(), pygame.sprite.Group(), pygame.sprite.Group(), pygame.sprite.Group()
-    all_sprites.add(player)
-    score, wave_timer, boss_fight_active, boss_powerup_spawn_timer = 0, 0, False, 0
-
 def show_adv_settings(): global game_state; game_state = "advanced_settings"
 
 def update_ui_positions():
     global btn_start, btn_fullscreen, btn_quit, btn_menu, btn_custom_start, btn_adv_settings
     global wave_input_box, dash_checkbox, rapid_checkbox, plasma_checkbox
-    global btn_resume, btn_smooth_camera, btn_toggle_fullscreen, btn_pause_to_main_menu, grid_surface
+    global btn_resume, btn_smooth_camera, btn_toggle_fullscreen, btn_pause_to_main_menu
     global btn_adv_back, adv_inputs
     
     btn_start = Button(WIDTH // 2 - 150, HEIGHT // 2 - 80, 300, 60, "Start Game (Wave 1)", lambda: start_game(False), font_size=30)
@@ -768,377 +1644,823 @@ def update_ui_positions():
         'spawn_count_mult': pygame.Rect(WIDTH // 2 + 50, HEIGHT // 2 + 20, 100, 40)
     }
 
-    grid_surface = create_grid_surface(WIDTH, HEIGHT, GRID_COLOR)
+    background.resize(WIDTH, HEIGHT)
+
+# Per-tick input is (button bits, mouse x, mouse y). Held keys are sampled each tick, clicks are queued until the next tick
+INPUT_UP, INPUT_LEFT, INPUT_DOWN, INPUT_RIGHT = 1, 2, 4, 8
+INPUT_FIRE_HELD, INPUT_FIRE, INPUT_DASH, INPUT_PLASMA = 16, 32, 64, 128
+INPUT_FORMAT = struct.Struct("<Bhh")
+REPLAY_MAGIC = b"AROWREC1"
+current_input, pending_input = (0, 0, 0), 0
+recorder, replay_frames, replay_header, session_seed = None, None, None, None
+
+def read_live_input():
+    keys, buttons = pygame.key.get_pressed(), pygame.mouse.get_pressed()
+    bits = pending_input
+    for key, bit in ((K_w, INPUT_UP), (K_a, INPUT_LEFT), (K_s, INPUT_DOWN), (K_d, INPUT_RIGHT)):
+        if keys[key]: bits |= bit
+    if buttons[0]: bits |= INPUT_FIRE_HELD
+    mouse_x, mouse_y = pygame.mouse.get_pos()
+    return bits, max(-32768, min(32767, mouse_x)), max(-32768, min(32767, mouse_y))
+
+def next_tick_input():
+    """ Sets current_input for the coming tick from the replay, or from live input (recording it). False once a replay runs out """
+    global current_input, pending_input
+    if replay_frames is not None:
+        if not replay_frames: return False
+        current_input = replay_frames.popleft()
+        return True
+    current_input, pending_input = bot_input() if launch_options.bot else read_live_input(), 0
+    if recorder: recorder.record(current_input)
+    return True
+
+def session_header(custom):
+    return {'seed': session_seed, 'custom': custom, 'start_wave': custom_start_wave_str, 'adv_settings': dict(adv_settings),
+            'custom_powerups': dict(custom_powerups), 'smooth_camera': smooth_camera_follow, 'view': [WIDTH, HEIGHT]}
+
+def session_summary():
+    """ End-of-game fingerprint stored with a recording, so a replay can tell whether it reproduced the session """
+    return {'ticks': sim_frame, 'wave': current_wave, 'score': score, 'health': player.health,
+            'pos': [round(player.pos.x, 3), round(player.pos.y, 3)], 'enemies': len(enemies)}
+
+class InputRecorder:
+    """ Collects packed per-tick input in memory; save() writes magic, a JSON header and the zlib-compressed ticks """
+    def __init__(self, path, header):
+        self.path, self.header, self.ticks = path, header, bytearray()
+
+    def record(self, frame):
+        self.ticks += INPUT_FORMAT.pack(*frame)
+
+    def save(self, summary):
+        header = dict(self.header, ticks=len(self.ticks) // INPUT_FORMAT.size, summary=summary)
+        meta = json.dumps(header).encode()
+        with open(self.path, 'wb') as f:
+            f.write(REPLAY_MAGIC + struct.pack("<I", len(meta)) + meta + zlib.compress(bytes(self.ticks), 9))
+        print(f"Recorded {header['ticks']} ticks to {self.path}")
+
+def finish_recording():
+    global recorder
+    if recorder:
+        recorder.save(session_summary())
+        recorder = None
+
+def load_replay(path):
+    with open(path, 'rb') as f: data = f.read()
+    if not data.startswith(REPLAY_MAGIC): raise ValueError(f"{path} is not an Arow recording")
+    meta_len = struct.unpack_from("<I", data, len(REPLAY_MAGIC))[0]
+    meta_end = len(REPLAY_MAGIC) + 4 + meta_len
+    header = json.loads(data[len(REPLAY_MAGIC) + 4:meta_end])
+    return header, deque(INPUT_FORMAT.iter_unpack(zlib.decompress(data[meta_end:])))
+
+def start_replay(path):
+    """ Restores the recorded settings and seed, then starts the game with the recorded input queued up """
+    global replay_frames, replay_header, custom_start_wave_str, smooth_camera_follow, WIDTH, HEIGHT, screen, fullscreen
+    replay_header, frames = load_replay(path)
+    custom_start_wave_str = replay_header['start_wave']
+    adv_settings.update(replay_header['adv_settings'])
+    custom_powerups.update(replay_header['custom_powerups'])
+    smooth_camera_follow = replay_header['smooth_camera']
+    if [WIDTH, HEIGHT] != replay_header['view']: # The camera (and so aiming) depends on the view size
+        WIDTH, HEIGHT = replay_header['view']
+        if not OFFSCREEN:
+            fullscreen, screen = False, pygame.display.set_mode((WIDTH, HEIGHT))
+        update_ui_positions()
+    replay_frames = deque()
+    start_game(replay_header['custom'], replay_header['seed'])
+    replay_frames = frames
+
+def replay_result():
+    expected, actual = replay_header.get('summary'), session_summary()
+    if expected is None: return "no summary recorded"
+    return "matched the recording" if expected == actual else f"DIVERGED: recorded {expected}, replayed {actual}"
+
+def finish_replay():
+    global replay_frames
+    if replay_frames is not None:
+        print(f"Replay {replay_result()}")
+        replay_frames = None
+
+def sim_ticks():
+    """ Milliseconds of game time. Advanced by update_game() instead of the wall clock so timers hold in headless runs """
+    return sim_frame * 1000 // SIM_FPS
+
+def update_game():
+    """ One frame of the game_state == "game" logic: input, movement, collisions and wave spawning """
+    global game_state, score, screen_shake, wave_timer, current_wave, boss_fight_active, boss_powerup_spawn_timer, sim_frame
+    sim_frame += 1
+    frame_timer.lap("input")
+    buttons = current_input[0]
+    if buttons & INPUT_DASH: player.dash()
+    if buttons & INPUT_FIRE and not player.rapid_fire_active and player.can_shoot():
+        bullets.add(Bullet(player.shoot_position(), player.angle));
+        player.ammo -= 1;
+        player.last_shot_time = sim_ticks()
+    if buttons & INPUT_PLASMA and player.has_plasma_ball:
+        plasma_balls.add(PlasmaBall(player.shoot_position(), player.angle));
+        player.has_plasma_ball = False
+    if player.rapid_fire_active and buttons & INPUT_FIRE_HELD and player.can_shoot():
+        bullets.add(Bullet(player.shoot_position(), player.angle));
+        player.ammo -= 1;
+        player.last_shot_time = sim_ticks()
+
+    player.update(camera);
+    frame_timer.lap("player update")
+    enemies.update(player, all_sprites);
+    boss_group.update(player, all_sprites);
+    commands.flush()
+    frame_timer.lap("enemy update")
+    bullets.update()
+    enemy_bullets.update()
+    plasma_balls.update();
+    particles.update();
+    beams.update();
+    powerups.update()
+    commands.flush()
+    frame_timer.lap("projectiles/fx")
+
+    if player.take_damage(0): game_state = "game_over"
+    enemy_hash.rebuild(enemies, boss_group)
+    frame_timer.lap("spatial hash")
+    for bullet in bullets:
+        if bullet.velocity.length_squared() > SWEEP_MIN_STEP ** 2:
+            hit_list = enemy_hash.sweep(*bullet.swept_body(), BULLET_HALF_WIDTH)
+        else:
+            hit_list = enemy_hash.collide(bullet)
+        if hit_list: commands.kill(bullet)
+        for enemy in hit_list:
+            if enemy.take_damage(1):
+                score += enemy.score_value;
+                create_particles(enemy.rect.center, 30, enemy.color, 2, 5, 20, 40)
+                if random.random() < POWERUP_DROP_CHANCE: commands.spawn(
+                    PowerUp(enemy.rect.center, random.choice(POWERUP_DROP_TABLE)), powerups)
+    frame_timer.lap("hit: player bullets")
+    if not player.is_dashing:
+        for hit_pos in enemy_bullets.collide(player.rect, PLAYER_HIT_RADIUS):
+            if player.take_damage(1): game_state = "game_over"
+            create_particles(hit_pos, 10, RED, 1, 3, 15, 25);
+            commands.shake(10)
+    frame_timer.lap("hit: enemy bullets")
+    for beam in beams:
+        if not player.is_dashing and beam.lifespan > 0 and beam.hits(player.pos, PLAYER_HIT_RADIUS):
+            if player.take_damage(beam.damage): game_state = "game_over"
+            create_particles(player.rect.center, 5, PURPLE, 1, 2, 10, 15);
+            commands.shake(5)
+    frame_timer.lap("hit: beams")
+    if not player.is_dashing:
+        touching = enemy_hash.collide(player)
+        for boss in boss_group: # A rushing boss can cover more ground in a tick than the overlap test sees
+            if boss not in touching and commands.in_play(boss) and boss.pos.distance_squared_to(boss.tick_start) > SWEEP_MIN_STEP ** 2:
+                if closest_on_segment(boss.tick_start, boss.pos, player.pos)[1] < boss.rect.width / 2 + PLAYER_HIT_RADIUS:
+                    touching.append(boss)
+        for enemy in touching:
+            if enemy in enemies: commands.kill(enemy)
+        if touching and player.take_damage(player.max_health): game_state = "game_over"
+    for p_ball in plasma_balls:
+        if enemy_hash.collide(p_ball): p_ball.explode()
+    frame_timer.lap("hit: contact/plasma")
+    for powerup in pygame.sprite.spritecollide(player, powerups, True):
+        if powerup.type == 'health':
+            player.health = min(player.max_health, player.health + 1)
+        elif powerup.type == 'rapid_fire':
+            player.rapid_fire_active, player.rapid_fire_end_time = True, sim_ticks() + 5000
+        elif powerup.type == 'dash_charge':
+            player.dash_charges = min(player.max_dash_charges, player.dash_charges + 1)
+        elif powerup.type == 'plasma_ball':
+            player.has_plasma_ball = True
+    commands.flush()
+    frame_timer.lap("hit: powerups")
+
+    if boss_fight_active:
+        boss_powerup_spawn_timer += 1
+        if boss_powerup_spawn_timer > BOSS_POWERUP_SPAWN_RATE:
+            boss_powerup_spawn_timer = 0
+            map_edge = (MAP_WIDTH - current_map_size) / 2
+            spawn_x = random.uniform(map_edge, map_edge + current_map_size)
+            spawn_y = random.uniform(map_edge, map_edge + current_map_size)
+            powerups.add(PowerUp((spawn_x, spawn_y), random.choice(POWERUP_DROP_TABLE)))
+        if not boss_group:
+            boss_fight_active = False;
+            player.health, player.ammo = player.max_health, player.max_ammo
+            create_particles(player.pos, 50, GREEN, 2, 6, 30, 60)
+    elif len(enemies) == 0 and not wave_director.pending and wave_timer > WAVE_COOLDOWN:
+        wave_timer, current_wave = 0, current_wave + 1
+        if memory_report: memory_report.wave_boundary()
+        if current_wave > 0 and current_wave % 10 == 0:
+            boss_fight_active = True;
+            boss_group.add(Boss(MAP_WIDTH / 2, MAP_HEIGHT / 2))
+        else:
+            wave_director.start_wave(current_wave)
+    elif len(enemies) == 0 and not wave_director.pending:
+        wave_timer += 1
+        next_wave = current_wave + 1
+        if wave_timer == 1 and next_wave % 10 != 0: wave_director.plan_wave(next_wave)
+    wave_director.update()
+    frame_timer.lap("wave spawn")
+
+    if screen_shake > 0: screen_shake -= 1
+
+    target_camera_x, target_camera_y = player.pos.x - WIDTH / 2, player.pos.y - HEIGHT / 2
+    if smooth_camera_follow: 
+        camera.x += (target_camera_x - camera.x) * camera_smooth_factor
+        camera.y += (target_camera_y - camera.y) * camera_smooth_factor
+    else: 
+        camera.x, camera.y = target_camera_x, target_camera_y
+    frame_timer.lap("camera")
+
+def store_render_positions():
+    """ Remembers where the camera and moving sprites were before the next tick so draw_game() can interpolate """
+    prev_camera.update(camera)
+    for group in (enemies, boss_group, bullets, plasma_balls, [player]):
+        for sprite in group: sprite.prev_center = sprite.rect.center
+
+def draw_sprites(surface, groups, view_rect, view, alpha):
+    """ Blits the on-screen sprites of groups, interpolated, in one Surface.blits call. Returns how many were drawn """
+    batch, vx, vy = [], view.x, view.y
+    for group in groups:
+        for sprite in group:
+            rect = sprite.rect
+            if not view_rect.colliderect(rect): continue
+            cx, cy = rect.center
+            px, py = getattr(sprite, 'prev_center', (cx, cy))
+            batch.append((sprite.image, (px + (cx - px) * alpha - rect.width / 2 - vx, py + (cy - py) * alpha - rect.height / 2 - vy)))
+    surface.blits(batch, doreturn=False)
+    return len(batch)
+
+def interpolated_topleft(sprite, alpha, view):
+    cx, cy = sprite.rect.center
+    px, py = getattr(sprite, 'prev_center', (cx, cy))
+    return (px + (cx - px) * alpha - sprite.rect.width / 2 - view.x,
+            py + (cy - py) * alpha - sprite.rect.height / 2 - view.y)
+
+def draw_game(alpha=1.0):
+    """ Renders the world and HUD, alpha of the way from the previous tick to the latest one. Never called in headless runs """
+    render_offset = [fx_random.randint(-screen_shake, screen_shake) if screen_shake > 0 else 0 for _ in 'xy']
+    view = prev_camera.lerp(camera, alpha)
+
+    # The world is drawn straight onto the display surface; shake just shifts the view instead of a full-screen layer blit
+    view = pygame.math.Vector2(view.x - render_offset[0], view.y - render_offset[1])
+    background.draw(screen, view)
+    frame_timer.lap("render: background")
+
+    # Cull against the viewport in world space, padded for shake and the interpolation step
+    margin = screen_shake + 32
+    view_rect = pygame.Rect(view.x - margin, view.y - margin, WIDTH + margin * 2, HEIGHT + margin * 2)
+
+    for enemy in enemies:
+        if enemy.archetype.telegraph: enemy.archetype.telegraph(enemy, view, view_rect)
+    for boss in boss_group:
+        if boss.laser_state == 'aiming' and view_rect.clipline(boss.rect.center, player.pos):
+            pygame.draw.line(screen, RED, (boss.rect.centerx - view.x, boss.rect.centery - view.y),
+                             (player.pos.x - view.x, player.pos.y - view.y), 3)
+        elif boss.laser_state == 'warning' and boss.laser_warn_timer % 10 < 5 and view_rect.colliderect(boss.rect):
+            pygame.draw.circle(screen, WHITE, (boss.rect.centerx - view.x, boss.rect.centery - view.y),
+                               boss.rect.width / 2)
+
+    if hasattr(player, 'trail'):
+        player.trail.draw(screen, view)
+
+    drawn = draw_sprites(screen, (enemies, boss_group, bullets), view_rect, view, alpha)
+    drawn += enemy_bullets.draw(screen, view, alpha)
+    drawn += draw_sprites(screen, (plasma_balls, powerups), view_rect, view, alpha)
+    drawn += particles.draw(screen, view, alpha)
+    for beam in beams: drawn += beam.draw(screen, view, view_rect)
+    screen.blit(player.image, interpolated_topleft(player, alpha, view))
+    drawn += 1
+    total = len(enemies) + len(boss_group) + len(bullets) + len(enemy_bullets) + len(plasma_balls) + len(powerups) + len(particles) + len(beams) + 1
+    frame_timer.count("drawn", drawn)
+    frame_timer.count("culled", total - drawn)
+
+    if show_spatial_debug:
+        enemy_hash.draw_debug(screen, view)
+
+    frame_timer.lap("render: world")
+
+    health_ratio = player.health / player.max_health if player.max_health > 0 else 0
+    pygame.draw.rect(screen, (80, 0, 0), (10, 10, 200, 20))
+    if player.health > 0: pygame.draw.rect(screen,
+                                           (GREEN if health_ratio > 0.5 else YELLOW if health_ratio > 0.2 else RED),
+                                           (10, 10, 200 * health_ratio, 20))
+    ammo_text = "RELOADING..." if player.reloading else f"AMMO: {player.ammo}/{player.max_ammo}"
+    screen.blit(render_text(font, ammo_text, WHITE), (10, 40))
+    screen.blit(render_text(font, f"SCORE: {score}", WHITE), (10, 70))
+    wave_text = "BOSS WAVE" if boss_fight_active else f"WAVE: {current_wave + 1}"
+    screen.blit(render_text(font, wave_text, WHITE), (WIDTH - 200, 10))
+    if boss_fight_active and boss_group:
+        boss = boss_group.sprites()[0]
+        boss_health_ratio = boss.health / boss.max_health if boss.max_health > 0 else 0
+        pygame.draw.rect(screen, (80, 0, 0), (WIDTH / 2 - 250, HEIGHT - 40, 500, 25))
+        if boss.health > 0: pygame.draw.rect(screen, PURPLE,
+                                             (WIDTH / 2 - 250, HEIGHT - 40, 500 * boss_health_ratio, 25))
+    for i in range(player.max_dash_charges): pygame.draw.rect(screen,
+                                                              BLUE if i < player.dash_charges else (50, 50, 50),
+                                                              (10 + i * 25, 110, 20, 20))
+    if player.has_plasma_ball: pygame.draw.circle(screen, BLUE, (120, 120), 15); pygame.draw.circle(screen, WHITE,
+                                                                                                    (120, 120), 8)
+    btn_menu.draw(screen)
+    frame_timer.count("text hits", text_cache.hits)
+    frame_timer.count("text misses", text_cache.misses)
+    frame_timer.lap("render: hud")
+    if frame_timer.visible:
+        frame_timer.draw(screen, 10, 150)
+        frame_timer.lap("timing overlay")
+
+def run_headless(max_frames=0, max_waves=0):
+    """ Steps update_game() with no drawing and no frame cap until the frame/wave limit or game over """
+    global custom_start_wave_str
+    if launch_options.replay:
+        start_replay(launch_options.replay)
+    else:
+        custom_start_wave_str = str(launch_options.start_wave)
+        adv_settings['infinite_health'] = adv_settings['infinite_health'] or launch_options.god
+        start_game(True)
+
+    frames, start_time = 0, time.perf_counter()
+    while game_state == "game":
+        frame_timer.start_frame()
+        if any(event.type == pygame.QUIT for event in pygame.event.get()): break # SDL turns SIGINT/SIGTERM into QUIT
+        if not next_tick_input(): break
+        update_game()
+        frame_timer.end_frame()
+        frames += 1
+        if max_frames and frames >= max_frames: break
+        if max_waves and current_wave + 1 >= max_waves: break
+    elapsed = max(time.perf_counter() - start_time, 1e-9)
+
+    outcome = "game over" if game_state == "game_over" else "stopped"
+    print(f"Headless run {outcome}: {frames} frames, wave {current_wave + 1}, score {score}, "
+          f"{elapsed:.2f}s ({frames / elapsed:.0f} frames/s)")
+    if wave_director.worst_wave is not None:
+        print(f"Worst wave spawn tick: {wave_director.worst_ms:.2f} ms (wave {wave_director.worst_wave})")
+    finish_replay()
+    finish_recording()
+    if launch_options.timing_csv: frame_timer.export_csv(launch_options.timing_csv)
+
+BENCHMARK_SCENARIOS = ["wave1", "wave30_x5", "boss_standard", "boss_summoner", "boss_rusher", "all_bosses", "particle_storm", "bot_wave5"]
+
+def setup_benchmark_scenario(name):
+    """ Boots a scenario through the Custom Start path, with god mode so nothing ends early """
+    global custom_start_wave_str, wave_timer, boss_fight_active
+    adv_settings.update({'enemy_health': 1.0, 'enemy_firerate': 1.0, 'spawn_count_mult': 1.0, 'infinite_health': True})
+    custom_start_wave_str = "1"
+    if name == "wave30_x5":
+        custom_start_wave_str, adv_settings['spawn_count_mult'] = "29", 5.0 # First spawn is the horde shown as WAVE: 30
+    elif name == "all_bosses":
+        custom_start_wave_str = "676767"
+    elif name == "bot_wave5":
+        custom_start_wave_str = "5" # Driven by bot_input(), so player bullets and their hit tests are exercised too
+    start_game(True)
+    if name.startswith("boss_"):
+        boss = Boss(MAP_WIDTH / 2, MAP_HEIGHT / 2 - 400, name[len("boss_"):])
+        boss.health = int(boss.max_health * 0.3)
+        boss.take_damage(0) # Moves it into stage 3
+        boss_group.add(boss)
+        boss_fight_active = True
+    elif not boss_fight_active:
+        wave_timer = WAVE_COOLDOWN + 1 # Spawn the first wave on tick one
+
+def run_benchmark_scenario(name, ticks, seed):
+    global current_input
+    seed_rngs(seed)
+    setup_benchmark_scenario(name)
+    seed_rngs(seed)
+    update_ms, render_ms, peak = [], [], {}
+    for _ in range(ticks):
+        if name == "bot_wave5": current_input = bot_input()
+        if name == "particle_storm":
+            for _ in range(8): create_particles(player.pos + (random.uniform(-600, 600), random.uniform(-350, 350)), 150, random.choice([BLUE, PURPLE, YELLOW, RED]), 1, 6, 40, 120)
+        pygame.event.pump()
+        start = time.perf_counter()
+        store_render_positions()
+        update_game()
+        mid = time.perf_counter()
+        draw_game()
+        pygame.display.flip()
+        end = time.perf_counter()
+        update_ms.append((mid - start) * 1000)
+        render_ms.append((end - mid) * 1000)
+        counts = {'enemies': len(enemies), 'bosses': len(boss_group), 'player_bullets': len(bullets),
+                  'enemy_bullets': len(enemy_bullets), 'particles': len(particles), 'beams': len(beams), 'powerups': len(powerups)}
+        for key, value in counts.items(): peak[key] = max(peak.get(key, 0), value)
+
+    def timing(values):
+        ordered = sorted(values)
+        return {'mean': sum(ordered) / len(ordered), 'p50': percentile(ordered, 0.5),
+                'p95': percentile(ordered, 0.95), 'p99': percentile(ordered, 0.99), 'max': ordered[-1]}
+    try:
+        import resource
+        peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except ImportError: # Not available on Windows
+        peak_rss_kb = None
+    return {'ticks': ticks, 'seed': seed, 'update_ms': timing(update_ms), 'render_ms': timing(render_ms),
+            'peak_entities': peak, 'final_entities': counts, 'peak_rss_kb': peak_rss_kb, 'startup_ms': startup_timings,
+            'wave_spawn_ms': wave_director.report(), 'text_cache': {'hits': text_cache.hits, 'misses': text_cache.misses}}
+
+def run_benchmark(selection, ticks, seed, output):
+    """ Runs each scenario in its own process so peak RSS is per scenario, then prints or writes one JSON report """
+    names = BENCHMARK_SCENARIOS if selection == "all" else selection.split(",")
+    unknown = [name for name in names if name not in BENCHMARK_SCENARIOS]
+    if unknown: sys.exit(f"Unknown benchmark scenario(s): {', '.join(unknown)}. Choose from: {', '.join(BENCHMARK_SCENARIOS)}")
+
+    if len(names) == 1:
+        results = {names[0]: run_benchmark_scenario(names[0], ticks, seed)}
+    else:
+        results = {}
+        for name in names:
+            proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--benchmark", name,
+                                   "--bench-ticks", str(ticks), "--seed", str(seed)], capture_output=True, text=True)
+            if proc.returncode != 0:
+                results[name] = {'error': proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"exit code {proc.returncode}"}
+            else:
+                results[name] = json.loads(proc.stdout[proc.stdout.index("{"):])['scenarios'][name]
+
+    report = json.dumps({'resolution': [WIDTH, HEIGHT], 'ticks': ticks, 'seed': seed, 'scenarios': results}, indent=2)
+    if output:
+        with open(output, 'w') as f: f.write(report + "\n")
+        print(f"Benchmark report written to {output}")
+    else:
+        print(report)
+
+SWEEP_MAX_TICKS = 36000 # Ten minutes of game time per run unless --frames says otherwise
+
+def bot_input():
+    """ Input for one tick from a simple bot: aim and fire at the nearest enemy, keep it at mid range while strafing,
+        dash out of contact range and throw the plasma ball into crowds. Only reads game state, so runs stay seeded """
+    targets = list(enemies) + list(boss_group)
+    if not targets: return 0, int(WIDTH / 2), int(HEIGHT / 2)
+    nearest = min(targets, key=lambda enemy: player.pos.distance_squared_to(enemy.pos))
+    offset = nearest.pos - player.pos
+    distance = offset.length()
+    if distance < 250: move = -offset
+    elif distance > 450: move = pygame.math.Vector2(offset)
+    else: move = offset.rotate(90 if (sim_frame // 180) % 2 else -90)
+    center = pygame.math.Vector2(MAP_WIDTH / 2, MAP_HEIGHT / 2)
+    if player.pos.distance_to(center) > current_map_size / 2 - 150: move += (center - player.pos).normalize() * max(move.length(), 1)
+
+    bits = INPUT_FIRE | INPUT_FIRE_HELD
+    if move.length_squared() > 0:
+        move.normalize_ip()
+        if move.x > 0.38: bits |= INPUT_RIGHT
+        if move.x < -0.38: bits |= INPUT_LEFT
+        if move.y > 0.38: bits |= INPUT_DOWN
+        if move.y < -0.38: bits |= INPUT_UP
+    if distance < 90: bits |= INPUT_DASH
+    if player.has_plasma_ball and len(targets) >= 6: bits |= INPUT_PLASMA
+    aim = nearest.pos - camera
+    return bits, max(-32768, min(32767, int(aim.x))), max(-32768, min(32767, int(aim.y)))
+
+def sweep_defaults():
+    """ The current value of every setting a sweep can vary """
+    settings = {key: adv_settings[key] for key in ('enemy_health', 'enemy_firerate', 'spawn_count_mult')}
+    settings['powerup_drop_chance'] = POWERUP_DROP_CHANCE
+    settings.update({f"weight.{name}": archetype.spawn_weight for name, archetype in ENEMY_ARCHETYPES.items()})
+    return settings
+
+def parse_sweep_grid(spec):
+    """ 'key=v1,v2 key2=v3' -> list of full settings dicts, one per grid point """
+    defaults, axes = sweep_defaults(), []
+    for term in spec.split():
+        key, _, values = term.partition("=")
+        if key not in defaults: sys.exit(f"Unknown sweep setting '{key}'. Choose from: {', '.join(defaults)}")
+        cast = int if key.startswith("weight.") else float
+        axes.append([(key, cast(value)) for value in values.split(",")])
+    grid = [dict(defaults, **dict(point)) for point in itertools.product(*axes)]
+    for point in grid:
+        weights = {key: value for key, value in point.items() if key.startswith("weight.")}
+        if min(weights.values()) < 0 or not any(weights.values()):
+            sys.exit("Every sweep grid point needs spawn weights >= 0 with at least one above 0, so some enemy can spawn. "
+                     f"This one has: {' '.join(f'{key}={value}' for key, value in weights.items())}")
+    return grid
+
+def run_sweep_job(job):
+    """ One seeded, bot-driven game with the given settings. Runs in a pool worker, so it resets every global it touches """
+    global POWERUP_DROP_CHANCE, ENEMY_SPAWN_POOL, current_input
+    settings, seed, max_ticks = job
+    adv_settings.update({key: settings[key] for key in ('enemy_health', 'enemy_firerate', 'spawn_count_mult')},
+                        infinite_health=False)
+    POWERUP_DROP_CHANCE = settings['powerup_drop_chance']
+    ENEMY_SPAWN_POOL = [name for name in ENEMY_ARCHETYPES for _ in range(settings[f"weight.{name}"])]
+    start_game(False, seed)
+    boss_kill_ticks, boss_start = [], None
+    start = time.perf_counter()
+    while game_state == "game" and sim_frame < max_ticks:
+        current_input = bot_input()
+        update_game()
+        if boss_fight_active and boss_start is None: boss_start = sim_frame
+        elif not boss_fight_active and boss_start is not None:
+            boss_kill_ticks.append(sim_frame - boss_start)
+            boss_start = None
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    return {'settings': settings, 'seed': seed, 'waves_survived': current_wave - (game_state == "game_over"),
+            'score': score, 'died': game_state == "game_over", 'ticks': sim_frame,
+            'boss_kill_s': [ticks / SIM_FPS for ticks in boss_kill_ticks], 'ticks_per_s': sim_frame / elapsed}
+
+def run_sweep(spec, seeds, base_seed, max_ticks, jobs, output):
+    """ Fans grid points x seeds out over a process pool and prints or writes per-grid-point aggregates as JSON """
+    grid = parse_sweep_grid(spec)
+    work = [(settings, base_seed + i, max_ticks) for settings in grid for i in range(seeds)]
+    jobs = jobs or os.cpu_count() or 1
+    os.environ["AROW_SWEEP"] = spec # Workers re-import this file; this keeps them offscreen and quiet
+    print(f"Sweep: {len(grid)} grid points x {seeds} seeds = {len(work)} runs on {jobs} processes", file=sys.stderr)
+    start, runs = time.perf_counter(), []
+    # spawn, not fork: a forked child can inherit a lock held by one of SDL's or NumPy's threads and hang
+    with multiprocessing.get_context("spawn").Pool(jobs) as pool:
+        for run in pool.imap_unordered(run_sweep_job, work, chunksize=max(1, len(work) // (jobs * 8))):
+            runs.append(run)
+            if len(runs) % max(1, len(work) // 20) == 0: print(f"  {len(runs)}/{len(work)} runs", file=sys.stderr)
+        pool.close() # Let the workers exit on their own; SDL turns the SIGTERM from terminate() into a QUIT event
+        pool.join()
+
+    def mean(values): return sum(values) / len(values) if values else None
+    results = []
+    for settings in grid:
+        matched = sorted((run for run in runs if run['settings'] == settings), key=lambda run: run['seed'])
+        boss_kills = [seconds for run in matched for seconds in run['boss_kill_s']]
+        varied = {key: value for key, value in settings.items() if any(point[key] != value for point in grid)}
+        results.append({'settings': varied or settings, 'runs': len(matched),
+                        'waves_survived': {'mean': mean([run['waves_survived'] for run in matched]),
+                                           'min': min(run['waves_survived'] for run in matched),
+                                           'max': max(run['waves_survived'] for run in matched)},
+                        'score_mean': mean([run['score'] for run in matched]),
+                        'death_rate': mean([run['died'] for run in matched]),
+                        'boss_kill_s': {'count': len(boss_kills), 'mean': mean(boss_kills)},
+                        'ticks_per_s_mean': mean([run['ticks_per_s'] for run in matched])})
+
+    report = json.dumps({'seeds': seeds, 'base_seed': base_seed, 'max_ticks': max_ticks, 'defaults': sweep_defaults(),
+                         'elapsed_s': time.perf_counter() - start, 'results': results}, indent=2)
+    if output:
+        with open(output, 'w') as f: f.write(report + "\n")
+        print(f"Sweep report written to {output}")
+    else:
+        print(report)
 
 btn_start, btn_fullscreen, btn_quit, btn_menu, btn_custom_start, btn_adv_settings = None, None, None, None, None, None
 wave_input_box, dash_checkbox, rapid_checkbox, plasma_checkbox = None, None, None, None
 btn_adv_back, adv_inputs = None, None
 star_field = []
 camera, game_state = pygame.math.Vector2(0, 0), "splash" if splash_screen_active else "menu"
+prev_camera, sim_accumulator = pygame.math.Vector2(0, 0), 0.0
 if game_state == "splash": 
     splash_start_time = pygame.time.get_ticks()
-reset_game();
-update_ui_positions()
-
-try:
 
-    splash_image_path = resource_path("calistasplash.png") 
-    splash_original_image = pygame.image.load(splash_image_path).convert_alpha()
-
-    original_width, original_height = splash_original_image.get_size()
-    new_width, new_height = int(original_width * 0.7), int(original_height * 0.7)
-    splash_image = pygame.transform.scale(splash_original_image, (new_width, new_height))
-    splash_rect = splash_image.get_rect(center=(WIDTH // 2, HEIGHT // 2))
-except pygame.error as e:
-
-    print(f"Warning: Could not load calistasplash.png. Error: {e}")
-    splash_screen_active = False 
-
-clock = pygame.time.Clock()
-running = True
-while running:
+# Startup work done behind the splash, one stage per frame. A stage returning True has more to do and runs again
+STARTUP_STAGES = [('numpy', load_numpy), ('fonts', load_fonts), ('ui', update_ui_positions), ('game', reset_game)]
+if splash_screen_active: # Otherwise nobody is waiting on a splash and the ship rotations stay lazy
+    STARTUP_STAGES.append(('player_sprites', lambda: warm_player_images(45)))
+startup_stage, splash_shown = 0, False
+
+def advance_startup():
+    """ Runs the next startup stage and adds its time to startup_timings. Returns False once startup is done """
+    global startup_stage
+    if startup_stage >= len(STARTUP_STAGES): return False
+    name, stage = STARTUP_STAGES[startup_stage]
+    start = time.perf_counter()
+    more = stage()
+    startup_timings[name] = startup_timings.get(name, 0) + (time.perf_counter() - start) * 1000
+    if not more:
+        startup_stage += 1
+        if startup_stage == len(STARTUP_STAGES) and not (launch_options.benchmark or launch_options.sweep):
+            stages = ", ".join(f"{name} {ms:.1f}" for name, ms in startup_timings.items())
+            print(f"Startup: {stages} ms; ready after {(time.perf_counter() - startup_begin) * 1000:.0f} ms")
+    return True
+
+def finish_startup():
+    while advance_startup(): pass
+
+if splash_screen_active:
+    splash_load_start = time.perf_counter()
+    try:
 
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT: running = False
-        if event.type == pygame.KEYDOWN:
-            if event.key == pygame.K_ESCAPE:
-                if game_state == "game":
+        splash_image_path = resource_path("calistasplash.png") 
+        splash_original_image = pygame.image.load(splash_image_path).convert_alpha()
+
+        original_width, original_height = splash_original_image.get_size()
+        new_width, new_height = int(original_width * 0.7), int(original_height * 0.7)
+        splash_image = pygame.transform.scale(splash_original_image, (new_width, new_height))
+        splash_rect = splash_image.get_rect(center=(WIDTH // 2, HEIGHT // 2))
+    except pygame.error as e:
+
+        print(f"Warning: Could not load calistasplash.png. Error: {e}")
+        splash_screen_active = False 
+    startup_timings['splash'] = (time.perf_counter() - splash_load_start) * 1000
+if not splash_screen_active:
+    finish_startup()
+
+if __name__ == "__main__" and launch_options.benchmark:
+    run_benchmark(launch_options.benchmark, launch_options.bench_ticks,
+                  launch_options.seed if launch_options.seed is not None else 1, launch_options.bench_output)
+    pygame.quit()
+elif __name__ == "__main__" and launch_options.sweep:
+    run_sweep(launch_options.sweep, launch_options.sweep_seeds, launch_options.seed if launch_options.seed is not None else 1,
+              launch_options.frames or SWEEP_MAX_TICKS, launch_options.jobs, launch_options.sweep_output)
+    pygame.quit()
+elif __name__ == "__main__" and HEADLESS:
+    run_headless(launch_options.frames, launch_options.waves)
+    pygame.quit()
+elif __name__ == "__main__":
+    clock = pygame.time.Clock()
+    running = True
+    if launch_options.replay:
+        splash_screen_active = False
+        finish_startup()
+        start_replay(launch_options.replay)
+    while running:
+        frame_seconds = clock.tick(launch_options.render_fps) / 1000
+        frame_timer.start_frame()
+
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT: running = False
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_ESCAPE:
+                    if game_state == "game":
+                        game_paused = True 
+                    elif game_state == "menu":
+                        running = False
+                if game_state == "game" and event.key == pygame.K_SPACE: pending_input |= INPUT_DASH
+                if game_state == "game" and event.key == pygame.K_F3: show_spatial_debug = not show_spatial_debug
+                if game_state == "game" and event.key == pygame.K_F4: frame_timer.visible = not frame_timer.visible
+                if game_state == "game" and event.key == pygame.K_F5:
+                    frame_timer.export_csv(launch_options.timing_csv or time.strftime("arow_timings_%Y%m%d_%H%M%S.csv"))
+                if event.key == pygame.K_p and game_state == "game": 
+                    game_paused = not game_paused
+                if game_state == "game" and event.key == pygame.K_ESCAPE:
                     game_paused = True 
-                elif game_state == "menu":
+                elif event.key == pygame.K_ESCAPE and game_state == "menu": 
                     running = False
-            if game_state == "game" and event.key == pygame.K_SPACE: player.dash()
-            if event.key == pygame.K_p and game_state == "game": 
-                game_paused = not game_paused
-            if game_state == "game" and event.key == pygame.K_ESCAPE:
-                game_paused = True 
-            elif event.key == pygame.K_ESCAPE and game_state == "menu": 
-                running = False
-            if game_state == "menu" and wave_input_active:
-                if event.key == pygame.K_BACKSPACE:
-                    custom_start_wave_str = custom_start_wave_str[:-1]
-                elif event.unicode.isdigit():
-                    custom_start_wave_str += event.unicode
-            elif game_state == "advanced_settings" and adv_input_active:
-                if event.key == pygame.K_BACKSPACE:
-                    adv_input_str = adv_input_str[:-1]
-                elif event.key == pygame.K_RETURN:
-                     # Apply
-                     try:
-                         val = float(adv_input_str)
-                         adv_settings[adv_input_active] = val
-                     except: pass
-                     adv_input_active = None
-                elif event.unicode.replace('.', '', 1).isdigit():
-                    adv_input_str += event.unicode
+                if game_state == "menu" and wave_input_active:
+                    if event.key == pygame.K_BACKSPACE:
+                        custom_start_wave_str = custom_start_wave_str[:-1]
+                    elif event.unicode.isdigit():
+                        custom_start_wave_str += event.unicode
+                elif game_state == "advanced_settings" and adv_input_active:
+                    if event.key == pygame.K_BACKSPACE:
+                        adv_input_str = adv_input_str[:-1]
+                    elif event.key == pygame.K_RETURN:
+                         # Apply
+                         try:
+                             val = float(adv_input_str)
+                             adv_settings[adv_input_active] = val
+                         except: pass
+                         adv_input_active = None
+                    elif event.unicode.replace('.', '', 1).isdigit():
+                        adv_input_str += event.unicode
                     
-        if event.type == pygame.VIDEORESIZE and not fullscreen:
-            WIDTH, HEIGHT = event.w, event.h;
-            screen = pygame.display.set_mode((WIDTH, HEIGHT), pygame.RESIZABLE);
-            update_ui_positions()
+            if event.type == pygame.VIDEORESIZE and not fullscreen:
+                WIDTH, HEIGHT = event.w, event.h;
+                screen = pygame.display.set_mode((WIDTH, HEIGHT), pygame.RESIZABLE);
+                update_ui_positions()
+
+            if game_state == "menu":
+                for btn in [btn_start, btn_fullscreen, btn_quit, btn_custom_start, dash_checkbox, rapid_checkbox,
+                            plasma_checkbox, btn_adv_settings]: btn.handle_event(event)
+                if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1: wave_input_active = wave_input_box.collidepoint(
+                    event.pos)
+        
+            elif game_state == "advanced_settings":
+                 btn_adv_back.handle_event(event)
+                 # Handle inputs click
+                 if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+                      adv_input_active = None
+                      for key, rect in adv_inputs.items():
+                          if rect.collidepoint(event.pos):
+                              adv_input_active = key
+                              adv_input_str = str(adv_settings[key])
+                      # Check infinite toggle
+                      toggle_rect = pygame.Rect(WIDTH // 2 + 50, HEIGHT // 2 + 80, 40, 40)
+                      if toggle_rect.collidepoint(event.pos):
+                          adv_settings['infinite_health'] = not adv_settings['infinite_health']
+            elif game_state == "game":
+                if game_paused:
+                    for btn in [btn_resume, btn_smooth_camera, btn_toggle_fullscreen, btn_pause_to_main_menu]:
+                        btn.handle_event(event)
+                else:
+                    btn_menu.handle_event(event)
+                    if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1: pending_input |= INPUT_FIRE
+                    if event.type == pygame.MOUSEBUTTONDOWN and event.button == 3: pending_input |= INPUT_PLASMA
 
         if game_state == "menu":
+            screen.fill(BLACK)
+            for star in star_field:
+                star[1] += star[2] * 0.2
+                if star[1] > HEIGHT: star[0], star[1] = random.randint(0, WIDTH), -5
+                pygame.draw.rect(screen, WHITE, (star[0], star[1], star[2], star[2]))
+
+            title_surf = render_text(title_font, "Arow", WHITE)
+            screen.blit(title_surf, title_surf.get_rect(
+                center=(WIDTH // 2, HEIGHT // 4 + math.sin(pygame.time.get_ticks() * 0.001) * 10)))
             for btn in [btn_start, btn_fullscreen, btn_quit, btn_custom_start, dash_checkbox, rapid_checkbox,
-                        plasma_checkbox, btn_adv_settings]: btn.handle_event(event)
-            if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1: wave_input_active = wave_input_box.collidepoint(
-                event.pos)
-        
+                        plasma_checkbox, btn_adv_settings]: btn.draw(screen)
+
+            screen.blit(render_text(font, "Custom Start Options", WHITE), (wave_input_box.x, wave_input_box.y - 30))
+            pygame.draw.rect(screen, (50, 50, 50), wave_input_box)
+            pygame.draw.rect(screen, GREEN if wave_input_active else (100, 100, 100), wave_input_box, 2)
+            screen.blit(render_text(ui_font, "Wave:", WHITE), (wave_input_box.x + 5, wave_input_box.y - 20))
+            wave_text_surf = render_text(font, custom_start_wave_str, WHITE);
+            screen.blit(wave_text_surf, wave_text_surf.get_rect(center=wave_input_box.center))
+
         elif game_state == "advanced_settings":
-             btn_adv_back.handle_event(event)
-             # Handle inputs click
-             if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-                  adv_input_active = None
-                  for key, rect in adv_inputs.items():
-                      if rect.collidepoint(event.pos):
-                          adv_input_active = key
-                          adv_input_str = str(adv_settings[key])
-                  # Check infinite toggle
-                  toggle_rect = pygame.Rect(WIDTH // 2 + 50, HEIGHT // 2 + 80, 40, 40)
-                  if toggle_rect.collidepoint(event.pos):
-                      adv_settings['infinite_health'] = not adv_settings['infinite_health']
-        elif game_state == "game":
-            if game_paused:
-                for btn in [btn_resume, btn_smooth_camera, btn_toggle_fullscreen, btn_pause_to_main_menu]:
-                    btn.handle_event(event)
-            else:
-                btn_menu.handle_event(event)
-                if not player.rapid_fire_active and event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and player.can_shoot():
-                    bullets.add(Bullet(player.shoot_position(), player.angle));
-                    player.ammo -= 1;
-                    player.last_shot_time = pygame.time.get_ticks()
-            if event.type == pygame.MOUSEBUTTONDOWN and event.button == 3 and player.has_plasma_ball:
-                plasma_balls.add(PlasmaBall(player.shoot_position(), player.angle));
-                player.has_plasma_ball = False
-
-    if game_state == "menu":
-        screen.fill(BLACK)
-        for star in star_field:
-            star[1] += star[2] * 0.2
-            if star[1] > HEIGHT: star[0], star[1] = random.randint(0, WIDTH), -5
-            pygame.draw.rect(screen, WHITE, (star[0], star[1], star[2], star[2]))
-
-        title_surf = title_font.render("Arow", True, WHITE)
-        screen.blit(title_surf, title_surf.get_rect(
-            center=(WIDTH // 2, HEIGHT // 4 + math.sin(pygame.time.get_ticks() * 0.001) * 10)))
-        for btn in [btn_start, btn_fullscreen, btn_quit, btn_custom_start, dash_checkbox, rapid_checkbox,
-                    plasma_checkbox, btn_adv_settings]: btn.draw(screen)
-
-        screen.blit(font.render("Custom Start Options", True, WHITE), (wave_input_box.x, wave_input_box.y - 30))
-        pygame.draw.rect(screen, (50, 50, 50), wave_input_box)
-        pygame.draw.rect(screen, GREEN if wave_input_active else (100, 100, 100), wave_input_box, 2)
-        screen.blit(ui_font.render("Wave:", True, WHITE), (wave_input_box.x + 5, wave_input_box.y - 20))
-        wave_text_surf = font.render(custom_start_wave_str, True, WHITE);
-        screen.blit(wave_text_surf, wave_text_surf.get_rect(center=wave_input_box.center))
-
-    elif game_state == "advanced_settings":
-         screen.fill(BLACK)
-         title = title_font.render("Advanced Settings", True, WHITE)
-         screen.blit(title, title.get_rect(center=(WIDTH // 2, HEIGHT // 5)))
+             screen.fill(BLACK)
+             title = render_text(title_font, "Advanced Settings", WHITE)
+             screen.blit(title, title.get_rect(center=(WIDTH // 2, HEIGHT // 5)))
          
-         labels = {
-             'enemy_health': "Enemy Health Multiplier:",
-             'enemy_firerate': "Enemy Cooldown Multiplier (Lower is faster):",
-             'spawn_count_mult': "Spawn Count Multiplier:"
-         }
+             labels = {
+                 'enemy_health': "Enemy Health Multiplier:",
+                 'enemy_firerate': "Enemy Cooldown Multiplier (Lower is faster):",
+                 'spawn_count_mult': "Spawn Count Multiplier:"
+             }
          
-         for key, rect in adv_inputs.items():
-             lbl = ui_font.render(labels[key], True, WHITE)
-             screen.blit(lbl, (rect.x - 300, rect.y + 10))
+             for key, rect in adv_inputs.items():
+                 lbl = render_text(ui_font, labels[key], WHITE)
+                 screen.blit(lbl, (rect.x - 300, rect.y + 10))
              
-             pygame.draw.rect(screen, (50, 50, 50), rect)
-             color = GREEN if adv_input_active == key else (100, 100, 100)
-             pygame.draw.rect(screen, color, rect, 2)
+                 pygame.draw.rect(screen, (50, 50, 50), rect)
+                 color = GREEN if adv_input_active == key else (100, 100, 100)
+                 pygame.draw.rect(screen, color, rect, 2)
              
-             txt = adv_input_str if adv_input_active == key else str(adv_settings[key])
-             ts = font.render(txt, True, WHITE)
-             screen.blit(ts, ts.get_rect(center=rect.center))
-
-         # God Mode
-         gm_lbl = ui_font.render("Infinite Health (God Mode):", True, WHITE)
-         screen.blit(gm_lbl, (WIDTH // 2 - 250, HEIGHT // 2 + 90))
-         gm_rect = pygame.Rect(WIDTH // 2 + 50, HEIGHT // 2 + 80, 40, 40)
-         pygame.draw.rect(screen, GREEN if adv_settings['infinite_health'] else RED, gm_rect)
-
-         btn_adv_back.draw(screen)
-
-    elif game_state == "splash": 
-        if splash_screen_active:
-            current_time = pygame.time.get_ticks()
-            elapsed_time = current_time - splash_start_time
-
-            screen.fill(BLACK) 
-
-            if splash_image and splash_rect:
-                alpha = 255
-                if elapsed_time < fade_in_duration: 
-                    alpha = int(255 * (elapsed_time / fade_in_duration))
-                elif elapsed_time > (splash_duration - fade_out_duration): 
-                    alpha = int(255 * ((splash_duration - elapsed_time) / fade_out_duration))
+                 txt = adv_input_str if adv_input_active == key else str(adv_settings[key])
+                 ts = render_text(font, txt, WHITE)
+                 screen.blit(ts, ts.get_rect(center=rect.center))
+
+             # God Mode
+             gm_lbl = render_text(ui_font, "Infinite Health (God Mode):", WHITE)
+             screen.blit(gm_lbl, (WIDTH // 2 - 250, HEIGHT // 2 + 90))
+             gm_rect = pygame.Rect(WIDTH // 2 + 50, HEIGHT // 2 + 80, 40, 40)
+             pygame.draw.rect(screen, GREEN if adv_settings['infinite_health'] else RED, gm_rect)
+
+             btn_adv_back.draw(screen)
+
+        elif game_state == "splash": 
+            if splash_screen_active:
+                current_time = pygame.time.get_ticks()
+                elapsed_time = current_time - splash_start_time
+
+                # One startup stage per frame, starting after the first frame so the splash shows immediately
+                if splash_shown: advance_startup()
+                screen.fill(BLACK) 
+
+                if splash_image and splash_rect:
+                    alpha = 255
+                    if elapsed_time < fade_in_duration: 
+                        alpha = int(255 * (elapsed_time / fade_in_duration))
+                    elif elapsed_time > (splash_duration - fade_out_duration): 
+                        alpha = int(255 * ((splash_duration - elapsed_time) / fade_out_duration))
+
+                    splash_image.set_alpha(alpha)
+                    screen.blit(splash_image, splash_rect)
+                splash_shown = True
+
+                if elapsed_time >= splash_duration:
+                    finish_startup()
+                    game_state = "menu" 
+                    splash_screen_active = False 
+            else:
+                finish_startup()
+                game_state = "menu" 
 
-                temp_splash_image = splash_image.copy()
-                temp_splash_image.set_alpha(alpha)
-                screen.blit(temp_splash_image, splash_rect)
+        elif game_state == "game" and game_paused: 
+            screen.fill(BLACK)
+            pause_text = render_text(title_font, "PAUSED", WHITE)
+            screen.blit(pause_text, pause_text.get_rect(center=(WIDTH // 2, HEIGHT // 4)))
+            for btn in [btn_resume, btn_smooth_camera, btn_toggle_fullscreen, btn_pause_to_main_menu]:
+                btn.draw(screen)
 
-            if elapsed_time >= splash_duration:
-                game_state = "menu" 
-                splash_screen_active = False 
-        else:
-            game_state = "menu" 
-
-    elif game_state == "game" and game_paused: 
-        screen.fill(BLACK)
-        pause_text = title_font.render("PAUSED", True, WHITE)
-        screen.blit(pause_text, pause_text.get_rect(center=(WIDTH // 2, HEIGHT // 4)))
-        for btn in [btn_resume, btn_smooth_camera, btn_toggle_fullscreen, btn_pause_to_main_menu]:
-            btn.draw(screen)
-
-    elif game_state == "game":
-        if player.rapid_fire_active and pygame.mouse.get_pressed()[0] and player.can_shoot():
-            bullets.add(Bullet(player.shoot_position(), player.angle));
-            player.ammo -= 1;
-            player.last_shot_time = pygame.time.get_ticks()
-
-        if not game_paused: 
-
-            player.update(camera);
-            enemies.update(player, all_sprites);
-            boss_group.update(player, all_sprites);
-            bullets.update()
-            plasma_balls.update();
-            particles.update();
-            beams.update();
-            powerups.update()
-
-            if player.take_damage(0): game_state = "game_over"
-            for bullet in list(bullets):
-                if not bullet.is_enemy:
-                    hit_list = pygame.sprite.spritecollide(bullet, enemies, False) + pygame.sprite.spritecollide(bullet,
-                                                                                                                 boss_group,
-                                                                                                                 False)
-                    if hit_list: bullet.kill()
-                    for enemy in hit_list:
-                        if enemy.take_damage(1):
-                            score += enemy.score_value;
-                            create_particles(enemy.rect.center, 30, enemy.color, 2, 5, 20, 40)
-                            if random.random() < POWERUP_DROP_CHANCE: powerups.add(
-                                PowerUp(enemy.rect.center, random.choice(POWERUP_DROP_TABLE)))
-            for bullet in bullets:
-                if bullet.is_enemy and not player.is_dashing and pygame.sprite.collide_rect(bullet, player):
-                    if player.take_damage(1): game_state = "game_over"
-                    bullet.kill();
-                    create_particles(bullet.rect.center, 10, RED, 1, 3, 15, 25);
-                    screen_shake = 10
-            for beam in beams:
-                if not player.is_dashing and beam.lifespan > 0 and pygame.sprite.collide_mask(beam, player):
-                    if player.take_damage(beam.damage): game_state = "game_over"
-                    create_particles(player.rect.center, 5, PURPLE, 1, 2, 10, 15);
-                    screen_shake = 5
-            if not player.is_dashing and (
-                    pygame.sprite.spritecollide(player, enemies, True) or pygame.sprite.spritecollide(player, boss_group,
-                                                                                                      False)):
-                if player.take_damage(player.max_health): game_state = "game_over"
-            for p_ball in list(plasma_balls):
-                if pygame.sprite.spritecollide(p_ball, enemies, False) or pygame.sprite.spritecollide(p_ball, boss_group,
-                                                                                                      False): p_ball.explode()
-            for powerup in pygame.sprite.spritecollide(player, powerups, True):
-                if powerup.type == 'health':
-                    player.health = min(player.max_health, player.health + 1)
-                elif powerup.type == 'rapid_fire':
-                    player.rapid_fire_active, player.rapid_fire_end_time = True, pygame.time.get_ticks() + 5000
-                elif powerup.type == 'dash_charge':
-                    player.dash_charges = min(player.max_dash_charges, player.dash_charges + 1)
-                elif powerup.type == 'plasma_ball':
-                    player.has_plasma_ball = True
-
-            if boss_fight_active:
-                boss_powerup_spawn_timer += 1
-                if boss_powerup_spawn_timer > BOSS_POWERUP_SPAWN_RATE:
-                    boss_powerup_spawn_timer = 0
-                    map_edge = (MAP_WIDTH - current_map_size) / 2
-                    spawn_x = random.uniform(map_edge, map_edge + current_map_size)
-                    spawn_y = random.uniform(map_edge, map_edge + current_map_size)
-                    powerups.add(PowerUp((spawn_x, spawn_y), random.choice(POWERUP_DROP_TABLE)))
-                if not boss_group:
-                    boss_fight_active = False;
-                    player.health, player.ammo = player.max_health, player.max_ammo
-                    create_particles(player.pos, 50, GREEN, 2, 6, 30, 60)
-            elif len(enemies) == 0 and wave_timer > WAVE_COOLDOWN:
-                wave_timer, current_wave = 0, current_wave + 1
-                if current_wave > 0 and current_wave % 10 == 0:
-                    boss_fight_active = True;
-                    boss_group.add(Boss(MAP_WIDTH / 2, MAP_HEIGHT / 2))
-                else:
-                    enemies_per_wave = int((2 + current_wave) * adv_settings['spawn_count_mult'])
-                    for _ in range(enemies_per_wave):
-                        map_rect = pygame.Rect((MAP_WIDTH - current_map_size) / 2, (MAP_HEIGHT - current_map_size) / 2,
-                                               current_map_size, current_map_size)
-                        
-                        # Weighted Spawn List
-                        # Tank and Turret appearing less often (~5% each approx, vs 10-20% for others)
-                        spawn_pool = ["charger"]*4 + ["shooter"]*4 + ["sniper"]*2 + ["kamikaze"]*4 + ["splitter"]*2 + ["tank"]*1 + ["turret"]*1
-                        enemy_type = random.choice(spawn_pool)
-                        
-                        if enemy_type == "turret":
-                            # Spawn turrets closer to center (random point in map)
-                            x = random.uniform(map_rect.left + 200, map_rect.right - 200)
-                            y = random.uniform(map_rect.top + 200, map_rect.bottom - 200)
-                        else:
-                            edge = random.choice(['top', 'bottom', 'left', 'right'])
-                            if edge == 'top':
-                                x, y = random.uniform(map_rect.left, map_rect.right), map_rect.top
-                            elif edge == 'bottom':
-                                x, y = random.uniform(map_rect.left, map_rect.right), map_rect.bottom
-                            elif edge == 'left':
-                                x, y = map_rect.left, random.uniform(map_rect.top, map_rect.bottom)
-                            else:
-                                x, y = map_rect.right, random.uniform(map_rect.top, map_rect.bottom)
-                        enemies.add(Enemy(x, y, enemy_type))
-            elif len(enemies) == 0:
-                wave_timer += 1
-
-        target_camera_x, target_camera_y = player.pos.x - WIDTH / 2, player.pos.y - HEIGHT / 2
-        if smooth_camera_follow: 
-            camera.x += (target_camera_x - camera.x) * camera_smooth_factor
-            camera.y += (target_camera_y - camera.y) * camera_smooth_factor
-        else: 
-            camera.x, camera.y = target_camera_x, target_camera_y
-
-        render_offset = [random.randint(-screen_shake, screen_shake) if screen_shake > 0 else 0 for _ in 'xy']
-        if screen_shake > 0: screen_shake -= 1
-
-        screen.fill(BLACK)
-        start_x, start_y = int(-camera.x + render_offset[0]) % 100, int(-camera.y + render_offset[1]) % 100
-
-        screen.blit(grid_surface, (start_x, start_y))
-        screen.blit(grid_surface, (start_x - WIDTH, start_y))
-        screen.blit(grid_surface, (start_x, start_y - HEIGHT))
-        screen.blit(grid_surface, (start_x - WIDTH, start_y - HEIGHT))
-
-        game_surf = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
-        map_rect = pygame.Rect(
-            ((MAP_WIDTH - current_map_size) / 2 - camera.x, (MAP_HEIGHT - current_map_size) / 2 - camera.y),
-            (current_map_size, current_map_size))
-        pygame.draw.rect(game_surf, WHITE, map_rect, 3)
-
-        for enemy in enemies:
-            if enemy.enemy_type == 'sniper' and enemy.state == 'aiming':
-                pygame.draw.line(game_surf, RED, (enemy.rect.centerx - camera.x, enemy.rect.centery - camera.y),
-                                 (player.pos.x - camera.x, player.pos.y - camera.y), 1)
-            elif enemy.enemy_type == 'sniper' and enemy.state == 'warning' and enemy.warn_timer % 10 < 5:
-                pygame.draw.circle(game_surf, WHITE, (enemy.rect.centerx - camera.x, enemy.rect.centery - camera.y),
-                                   enemy.rect.width)
-        for boss in boss_group:
-            if boss.laser_state == 'aiming':
-                pygame.draw.line(game_surf, RED, (boss.rect.centerx - camera.x, boss.rect.centery - camera.y),
-                                 (player.pos.x - camera.x, player.pos.y - camera.y), 3)
-            elif boss.laser_state == 'warning' and boss.laser_warn_timer % 10 < 5:
-                pygame.draw.circle(game_surf, WHITE, (boss.rect.centerx - camera.x, boss.rect.centery - camera.y),
-                                   boss.rect.width / 2)
-
-        if hasattr(player, 'trail'):
-            player.trail.draw(game_surf, camera)
-
-        for group in [enemies, boss_group, bullets, plasma_balls, powerups, particles, beams, [player]]:
-            for sprite in group: game_surf.blit(sprite.image, (sprite.rect.x - camera.x, sprite.rect.y - camera.y))
-
-        screen.blit(game_surf, render_offset)
-
-        health_ratio = player.health / player.max_health if player.max_health > 0 else 0
-        pygame.draw.rect(screen, (80, 0, 0), (10, 10, 200, 20))
-        if player.health > 0: pygame.draw.rect(screen,
-                                               (GREEN if health_ratio > 0.5 else YELLOW if health_ratio > 0.2 else RED),
-                                               (10, 10, 200 * health_ratio, 20))
-        ammo_text = "RELOADING..." if player.reloading else f"AMMO: {player.ammo}/{player.max_ammo}"
-        screen.blit(font.render(ammo_text, True, WHITE), (10, 40))
-        screen.blit(font.render(f"SCORE: {score}", True, WHITE), (10, 70))
-        wave_text = "BOSS WAVE" if boss_fight_active else f"WAVE: {current_wave + 1}"
-        screen.blit(font.render(wave_text, True, WHITE), (WIDTH - 200, 10))
-        if boss_fight_active and boss_group:
-            boss = boss_group.sprites()[0]
-            boss_health_ratio = boss.health / boss.max_health if boss.max_health > 0 else 0
-            pygame.draw.rect(screen, (80, 0, 0), (WIDTH / 2 - 250, HEIGHT - 40, 500, 25))
-            if boss.health > 0: pygame.draw.rect(screen, PURPLE,
-                                                 (WIDTH / 2 - 250, HEIGHT - 40, 500 * boss_health_ratio, 25))
-        for i in range(player.max_dash_charges): pygame.draw.rect(screen,
-                                                                  BLUE if i < player.dash_charges else (50, 50, 50),
-                                                                  (10 + i * 25, 110, 20, 20))
-        if player.has_plasma_ball: pygame.draw.circle(screen, BLUE, (120, 120), 15); pygame.draw.circle(screen, WHITE,
-                                                                                                        (120, 120), 8)
-        btn_menu.draw(screen)
-
-    elif game_state == "game_over":
-        screen.fill(BLACK)
-        for f, t, c, y in [(title_font, "GAME OVER", RED, HEIGHT // 3),
-                           (font, f"Final Score: {score}", WHITE, HEIGHT // 2),
-                           (font, "Press R to restart or M for menu", WHITE, HEIGHT // 2 + 50)]:
-            surf = f.render(t, True, c);
-            screen.blit(surf, surf.get_rect(center=(WIDTH // 2, y)))
-        keys = pygame.key.get_pressed()
-        if keys[pygame.K_r]:
-            start_game()
-        elif keys[pygame.K_m]:
-            show_main_menu()
-
-    pygame.display.flip()
-    clock.tick(60)
-
-pygame.quit()
+        elif game_state == "game":
+            # Fixed-rate simulation; a slow frame runs extra ticks, capped so one hitch can't snowball
+            sim_accumulator += frame_seconds
+            ticks = 0
+            # Stops on the tick the game ends, like the headless loop, so recordings and replays end on the same tick
+            while sim_accumulator >= SIM_DT and ticks < launch_options.max_catchup and game_state == "game":
+                if not next_tick_input():
+                    finish_replay()
+                    show_main_menu()
+                    break
+                store_render_positions()
+                update_game()
+                sim_accumulator -= SIM_DT
+                ticks += 1
+            if sim_accumulator >= SIM_DT: sim_accumulator %= SIM_DT
+            draw_game(sim_accumulator / SIM_DT)
+
+        elif game_state == "game_over":
+            screen.fill(BLACK)
+            for f, t, c, y in [(title_font, "GAME OVER", RED, HEIGHT // 3),
+                               (font, f"Final Score: {score}", WHITE, HEIGHT // 2),
+                               (font, "Press R to restart or M for menu", WHITE, HEIGHT // 2 + 50)]:
+                surf = render_text(f, t, c);
+                screen.blit(surf, surf.get_rect(center=(WIDTH // 2, y)))
+            keys = pygame.key.get_pressed()
+            if keys[pygame.K_r]:
+                start_game()
+            elif keys[pygame.K_m]:
+                show_main_menu()
+
+        pygame.display.flip()
+        if game_state == "game" and not game_paused:
+            frame_timer.lap("flip")
+            frame_timer.end_frame()
+        elif game_state != "game":
+            finish_recording()
+            finish_replay()
+
+    finish_recording()
+    if launch_options.timing_csv: frame_timer.export_csv(launch_options.timing_csv)
+    pygame.quit()